@@ -0,0 +1,209 @@
+from contextlib import redirect_stdout
+import argparse, io, json, math, platform, sys, time, tracemalloc
+import numpy as np
+from scipy import sparse
+from core import Population, Status, STATUS_CODES
+from models import SIR, SEIRD
+from metapopulation import Metapopulation
+from simulation import Simulation
+from profiling import PHASES
+from visualisations import Plot
+
+# Parameters of the agent based and of the ODE benchmarks
+AGENT_PARAMS = {"beta": 0.02, "gamma": 0.1}
+ODE_PARAMS = {"beta": 0.001, "gamma": 0.1, "sigma": 0.2, "mu": 0.01}
+
+# Individuals per unit of world area, kept constant across population sizes
+DENSITY = 0.5
+
+
+def measure(name, size, setup, run, items, repeat=5):
+    """
+    Times run(setup()) repeat times, keeping the best time, then runs it once more under
+    tracemalloc for its peak memory. items is the amount of work per run, for throughput.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "name": name,
+        "size": size,
+        "seconds": best,
+        "throughput": items / best if best else math.inf,
+        "peak_bytes": peak,
+    }
+
+
+def mid_epidemic(size):
+    """A simulation with 1% of its individuals infectious, for per tick benchmarks."""
+    side = math.sqrt(size / DENSITY)
+    sim = Simulation(size, AGENT_PARAMS, 100, (side, side), rng=0)
+    infected = sim.rng.choice(len(sim.population), max(size // 100, 1), replace=False)
+    infected = infected[sim.population.status[infected] == STATUS_CODES[Status.SUSCEPTIBLE]]
+    sim.population.set_status(infected, Status.INFECTIOUS)
+    sim.schedule_removal(infected, sim.infectious_ticks())
+    return sim
+
+
+def population_benchmarks(size, repeat):
+    """Population construction and counting."""
+    population = Population(size, rng=0)
+    yield measure(
+        "population_build", size, lambda: None, lambda _: Population(size, rng=0), size, repeat
+    )
+    yield measure("get_counts", size, lambda: population, Population.get_counts, 1, repeat)
+
+
+def tick_benchmarks(size, repeat):
+    """The phases of one agent based simulation tick."""
+    sim = mid_epidemic(size)
+    for phase in PHASES:
+        yield measure(phase, size, lambda: sim, getattr(Simulation, phase), size, repeat)
+
+
+def solver_benchmarks(resolutions, repeat, duration=100):
+    """ODE solves at several time grid resolutions, without the solution cache."""
+    for step in resolutions:
+        time_points = np.arange(0, duration + step, step)
+        points = len(time_points)
+
+        def solve_sir(_):
+            SIR.solve_sir([999, 1, 0], ODE_PARAMS, time_points)
+
+        def solve_seird(_):
+            SEIRD.solve_seird([999, 0, 1, 0, 0], ODE_PARAMS, time_points)
+
+        yield measure("solve_sir", points, lambda: None, solve_sir, points, repeat)
+        yield measure("solve_seird", points, lambda: None, solve_seird, points, repeat)
+
+
+def mobility_graphs(patches, rate=0.01, degree=4):
+    """A lattice of patches exchanging with their neighbours, and a random mobility graph."""
+    side = math.isqrt(patches)
+    chain = sparse.diags([1.0, 1.0], [-1, 1], shape=(side, side))
+    identity = sparse.identity(side)
+    yield "lattice", rate * (sparse.kron(identity, chain) + sparse.kron(chain, identity))
+
+    rng = np.random.default_rng(0)
+    sources, targets = rng.integers(patches, size=(2, degree * patches))
+    flows = np.full(degree * patches, rate)
+    yield "random", sparse.csr_matrix((flows, (targets, sources)), shape=(patches, patches))
+
+
+def metapopulation_benchmarks(sizes, repeat, duration=100):
+    """Metapopulation solves with every solver, and stochastic runs, on both graphs."""
+    time_points = np.arange(0, duration + 1.0)
+    for patches in sizes:
+        for graph, mobility in mobility_graphs(patches):
+            meta = Metapopulation("SEIRD", mobility)
+            inits = np.zeros((5, meta.patches))
+            inits[0], inits[2, 0] = 1000, 1
+
+            for method in ("RK45", "BDF", "Radau"):
+
+                def solve(_, method=method):
+                    meta.solve(inits, ODE_PARAMS, time_points, method=method, rtol=1e-6)
+
+                name = f"metapopulation_{graph}_{method}"
+                yield measure(name, meta.patches, lambda: None, solve, meta.patches, repeat)
+
+            def simulate(_):
+                meta.simulate(inits.astype(np.int64), ODE_PARAMS, time_points[:11], rng=0)
+
+            name = f"metapopulation_{graph}_simulate"
+            yield measure(name, meta.patches, lambda: None, simulate, meta.patches, repeat)
+
+
+def plot_benchmarks(resolutions, repeat, duration=100):
+    """Terminal plots of solutions at several time grid resolutions."""
+    for step in resolutions:
+        time_points = np.arange(0, duration + step, step)
+        S, I, R, t = SIR.solve_sir([999, 1, 0], ODE_PARAMS, time_points)
+
+        def render(_):
+            with redirect_stdout(io.StringIO()):
+                Plot.terminal([S, I, R], "SIR", t)
+
+        yield measure("plot_terminal", len(t), lambda: None, render, len(t), repeat)
+
+
+def run_suite(sizes, resolutions, repeat, patches=(1024, 3025)):
+    """Runs every benchmark and returns the results as a list of records."""
+    results = []
+    for size in sizes:
+        results += population_benchmarks(size, repeat)
+        results += tick_benchmarks(size, repeat)
+    results += solver_benchmarks(resolutions, repeat)
+    results += metapopulation_benchmarks(patches, repeat)
+    results += plot_benchmarks(resolutions, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results against a baseline run, matching benchmarks by name and size.
+    Returns the records that got slower than the baseline by more than tolerance.
+    """
+    reference = {(record["name"], record["size"]): record for record in baseline}
+    regressions = []
+    for record in results:
+        base = reference.get((record["name"], record["size"]))
+        if base is None:
+            continue
+        record["baseline_seconds"] = base["seconds"]
+        record["ratio"] = record["seconds"] / base["seconds"]
+        if record["ratio"] > 1 + tolerance:
+            regressions.append(record)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the EpiSimPy hot paths.")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10**2, 10**3, 10**4, 10**5, 10**6]
+    )
+    parser.add_argument("--resolutions", type=float, nargs="+", default=[1, 0.1, 0.01])
+    parser.add_argument(
+        "--patches", type=int, nargs="+", default=[1024, 3025], help="metapopulation sizes"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed slowdown, as a fraction"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.resolutions, args.repeat, args.patches)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+        "regressions": [(record["name"], record["size"]) for record in regressions],
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+from collections import OrderedDict
+import hashlib, json, os
+import numpy as np
+from models import MODEL_SOLVERS
+
+
+class SolutionCache:
+    """
+    Content-addressed cache of ODE solutions.
+    Solutions are keyed on a hash of the normalized inputs (model, initial values,
+    parameters, time grid and solver options). Recently used ones are kept in a bounded
+    in-memory LRU, and optionally in a directory of compressed .npz files whose total
+    size is bounded by evicting the least recently used files.
+    """
+
+    def __init__(self, maxsize=128, directory=None, max_bytes=256 * 2**20):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._memory = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(model, inits, params, time_steps, **options):
+        """Hash of the normalized solver inputs."""
+        inits = np.ascontiguousarray(inits, dtype=np.float64)
+        time_steps = np.ascontiguousarray(time_steps, dtype=np.float64)
+        header = {
+            "model": model,
+            "params": {name: float(value) for name, value in params.items()},
+            "options": options,
+            "shapes": [inits.shape, time_steps.shape],
+        }
+
+        digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode())
+        digest.update(inits.tobytes())
+        digest.update(time_steps.tobytes())
+        return digest.hexdigest()
+
+    def solve(self, model, inits, params, time_steps, full_output=False, **options):
+        """
+        Same as SIR.solve_sir or SEIRD.solve_seird (chosen by model), served from the
+        cache when the same inputs were solved before. Returned arrays are read-only, and
+        with full_output the stats say whether the solution was "cached".
+        """
+        key = self.key(model, inits, params, time_steps, **options)
+        entry = self.get(key)
+        cached = entry is not None
+
+        if entry is None:
+            *series, t, stats = MODEL_SOLVERS[model](
+                inits, params, time_steps, **options, full_output=True
+            )
+            entry = {"y": np.array(series), "t": np.asarray(t), "stats": stats}
+            self.put(key, entry)
+
+        result = (*entry["y"], entry["t"])
+        if full_output:
+            # On a hit, the evaluation counts are those of the solve that was cached
+            return (*result, {**entry["stats"], "cached": cached})
+        return result
+
+    def get(self, key):
+        """Looks a solution up in memory, then on disk. Returns None on a miss."""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+
+        path = self._path(key)
+        if path is not None:
+            # Other processes sharing the directory may evict the file at any moment,
+            # a file gone before it is read or touched is a miss
+            try:
+                with np.load(path) as data:
+                    entry = {
+                        "y": data["y"],
+                        "t": data["t"],
+                        "stats": json.loads(str(data["stats"])),
+                    }
+                os.utime(path)  # Mark as recently used for the eviction
+            except FileNotFoundError:
+                pass
+            else:
+                self._remember(key, entry)
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        """Stores a solution in memory and, when enabled, on disk."""
+        for name in ("y", "t"):
+            entry[name].flags.writeable = False
+        self._remember(key, entry)
+
+        path = self._path(key)
+        if path is None:
+            return
+
+        # Write to a temporary file first, so readers never see a partial file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            np.savez_compressed(
+                file, y=entry["y"], t=entry["t"], stats=np.array(json.dumps(entry["stats"]))
+            )
+        os.replace(temporary, path)
+        self._evict_files()
+
+    def clear(self):
+        """Empties the in-memory tier and deletes the files of the on-disk tier."""
+        self._memory.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".npz"):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+
+    def _remember(self, key, entry):
+        """Adds an entry to the in-memory LRU, dropping the least recently used one."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _evict_files(self):
+        """Deletes the least recently used files until the directory fits in max_bytes."""
+        # Files may be deleted by other processes evicting at the same time
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+# Cache shared by default, on disk when EPISIMPY_CACHE names a directory
+default_cache = SolutionCache(directory=os.environ.get("EPISIMPY_CACHE"))
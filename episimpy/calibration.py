@@ -0,0 +1,362 @@
+from functools import partial
+import math
+import numpy as np
+from scipy.integrate import solve_ivp
+from core import Status, COMPARTMENTS
+from models import SIR, SEIRD
+from sweep import map_chunks
+
+# Parameters of each model, in the order of its parameter_jacobian
+PARAMS = {"SIR": ("beta", "gamma"), "SEIRD": ("beta", "sigma", "gamma", "mu")}
+
+# Right hand side, Jacobian and parameter Jacobian of each model
+MODELS = {
+    "SIR": (SIR.sir_model, SIR.jacobian, SIR.parameter_jacobian),
+    "SEIRD": (SEIRD.seird_model, SEIRD.jacobian, SEIRD.parameter_jacobian),
+}
+
+# Besides the parameters, the initial number of infectious individuals can be fitted
+INITIAL = "infectious"
+
+# Ranges start points are drawn from, log-uniformly, and bounds of the fitted values.
+# beta is a per individual rate, so its ranges are divided by the population.
+STARTS = {
+    "beta": (0.05, 2.0),
+    "sigma": (0.05, 1.0),
+    "gamma": (0.02, 0.5),
+    "mu": (1e-4, 0.05),
+    INITIAL: (1, 100),
+}
+# Rates are per day, daily data says little about faster ones and they make solves stiff.
+BOUNDS = {
+    "beta": (1e-3, 10),
+    "sigma": (1e-3, 2),
+    "gamma": (1e-3, 2),
+    "mu": (1e-6, 1),
+    INITIAL: (1e-3, None),  # Up to the whole population
+}
+
+LOSSES = ("least_squares", "poisson")
+
+# Daily counts that can be observed besides the compartments: the individuals taking a
+# flow each day, from the change of the compartments it empties or fills. Cases are the
+# newly infectious (sigma E in SEIRD, beta S I in SIR), leaving S and E, when there is one.
+INCIDENCE = {
+    "cases": {Status.SUSCEPTIBLE: -1, Status.EXPOSED: -1},
+    "recoveries": {Status.RECOVERED: 1},
+    "deaths": {Status.DEAD: 1},
+}
+
+
+def initial_values(model, population, infectious):
+    """
+    Initial values of the model: infectious individuals, everyone else susceptible.
+    With arrays of K populations, a (compartments, K) array.
+    """
+    compartments = COMPARTMENTS[model]
+    susceptible = np.asarray(population - infectious, dtype=float)
+    inits = np.zeros((len(compartments), *susceptible.shape))
+    inits[compartments.index(Status.SUSCEPTIBLE)] = susceptible
+    inits[compartments.index(Status.INFECTIOUS)] = infectious
+    return inits
+
+
+def sensitivities(model, population, values, time_steps, rtol=1e-5, atol=1e-6):
+    """
+    Solves the model together with its forward sensitivity equations,
+    d/dt dx/dp = J dx/dp + df/dp, using the models' analytical Jacobians.
+    Sensitivities are taken with respect to the logarithm of every parameter in
+    PARAMS[model] and of the initial number of infectious individuals (INITIAL), the
+    last. values maps each of them to a scalar or a length K array, and K scenarios
+    are solved together as one system, like solve_ensemble.
+    Returns (compartments, K, T) solutions and (compartments, parameters + 1, K, T)
+    sensitivities.
+    """
+    model_function, jacobian, parameter_jacobian = MODELS[model]
+    names = (*PARAMS[model], INITIAL)
+    k = np.broadcast(population, *(values[name] for name in names)).size
+    values = {name: np.broadcast_to(np.asarray(values[name], dtype=float), (k,)) for name in names}
+    params = {name: values[name] for name in PARAMS[model]}
+    # Chain rule for the logarithms: d/dlog(q) = q d/dq
+    scale = np.array([values[name] for name in PARAMS[model]])
+    compartments, columns = len(COMPARTMENTS[model]), len(names)
+
+    def augmented(t, y):
+        x = y[: compartments * k].reshape(compartments, k)
+        s = y[compartments * k :].reshape(compartments, columns, k)
+        ds = np.einsum("ijk,jlk->ilk", jacobian(t, x, params), s)
+        ds[:, :-1] += parameter_jacobian(t, x, params) * scale
+        return np.concatenate([np.ravel(model_function(t, x, params)), ds.ravel()])
+
+    # Infectious individuals start out at the expense of susceptible ones
+    s0 = np.zeros((compartments, columns, k))
+    s0[:, -1] = initial_values(model, 0, 1)[:, None] * values[INITIAL]
+    x0 = initial_values(model, np.broadcast_to(population, (k,)), values[INITIAL])
+
+    result = solve_ivp(
+        augmented,
+        (time_steps[0], time_steps[-1]),
+        np.concatenate([x0.ravel(), s0.ravel()]),
+        t_eval=time_steps,
+        rtol=rtol,
+        atol=atol,
+    )
+    y = result.y
+    return (
+        y[: compartments * k].reshape(compartments, k, -1),
+        y[compartments * k :].reshape(compartments, columns, k, -1),
+    )
+
+
+def fit(
+    model,
+    time_steps,
+    observed,
+    population,
+    start,
+    fitted=None,
+    loss="least_squares",
+    max_iterations=100,
+    tolerance=1e-6,
+):
+    """
+    Fits the model to observed series, one series or a (K, T) array of series for K fits
+    at once, missing values given as NaN. observed maps compartment names (or Status) to
+    their levels at time_steps, and INCIDENCE names to the daily counts between
+    consecutive time_steps (T - 1 of them). population and every value in start (all
+    parameters and INITIAL) are scalars or length K arrays; the fitted values (all by
+    default) only start there.
+
+    Fitting happens in log space, by Levenberg-Marquardt on the sensitivity equations'
+    gradients, all K fits in lockstep so every iteration is a single ODE solve. The loss
+    is least squares on residuals scaled by each series' peak, or the Poisson deviance
+    of daily counts (fitted by Fisher scoring), i.e. the negative log-likelihood less its
+    minimum; levels are not independent counts, so it only takes INCIDENCE series.
+    Returns a list of K dicts of the fitted params and inits, the loss and statistics.
+    """
+    if loss not in LOSSES:
+        raise ValueError(f"loss must be one of {LOSSES}")
+    fitted = tuple(fitted or (*PARAMS[model], INITIAL))
+    columns = [(*PARAMS[model], INITIAL).index(name) for name in fitted]
+    combination, daily = _observables(model, observed)
+    if loss == "poisson" and not daily.all():
+        raise ValueError(f"the poisson loss only fits daily counts, one of {tuple(INCIDENCE)}")
+
+    # Observations as a (K, observed, T) array, daily counts are missing on the first day
+    series = []
+    for value, incidence in zip(observed.values(), daily):
+        value = np.atleast_2d(np.asarray(value, dtype=float))
+        if incidence:
+            value = np.concatenate([np.full((len(value), 1), np.nan), value], axis=1)
+        series.append(value)
+    y = np.stack(series, axis=1)
+    k = np.broadcast(y[:, 0, 0], population, *start.values()).size
+    y = np.broadcast_to(y, (k, *y.shape[1:]))
+    present = np.isfinite(y)
+    y = np.where(present, y, 0.0)
+    weight = present / np.maximum(y.max(axis=2, keepdims=True), 1.0) ** 2
+    population = np.broadcast_to(np.asarray(population, dtype=float), (k,))
+
+    lower, upper = np.log(_bounds(fitted, population))
+
+    start = {
+        name: np.broadcast_to(np.asarray(value, dtype=float), (k,)) for name, value in start.items()
+    }
+    theta = np.clip(np.log([start[name] for name in fitted]).T, lower, upper)
+
+    def evaluate(indices, theta):
+        """Loss, gradient and Gauss-Newton Hessian of the given fits."""
+        values = {name: value[indices] for name, value in start.items()}
+        values.update(zip(fitted, np.exp(theta.T)))
+        x, s = sensitivities(model, population[indices], values, time_steps)
+        x = np.einsum("oc,ckt->kot", combination, x)  # (K, observed, T)
+        s = np.einsum("oc,cpkt->kopt", combination, s[:, columns])  # (K, observed, fitted, T)
+        # Daily counts are the changes over every day, and so are their sensitivities
+        x[:, daily, 1:] = np.diff(x[:, daily], axis=-1)
+        s[:, daily, :, 1:] = np.diff(s[:, daily], axis=-1)
+
+        error = x - y[indices]
+        if loss == "least_squares":
+            w = weight[indices]
+            value = 0.5 * np.sum(w * error**2, axis=(1, 2))
+        else:
+            mu = np.maximum(x, 1e-9)
+            w = present[indices] / mu
+            observed_y = y[indices]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                terms = mu - observed_y + np.where(
+                    observed_y > 0, observed_y * np.log(observed_y / mu), 0.0
+                )
+            value = np.sum(np.where(present[indices], terms, 0.0), axis=(1, 2))
+        gradient = np.einsum("kot,kot,kopt->kp", w, error, s)
+        hessian = np.einsum("kot,kopt,koqt->kpq", w, s, s)
+        return value, gradient, hessian
+
+    value, gradient, hessian = evaluate(np.arange(k), theta)
+    damping = np.full(k, 1e-2)
+    iterations = np.zeros(k, dtype=int)
+    converged = np.zeros(k, dtype=bool)
+    active = np.arange(k)
+
+    for _ in range(max_iterations):
+        if not active.size:
+            break
+        # Values on a bound the gradient pushes against are held there, the rest step
+        g, h = gradient[active], hessian[active]
+        held = ((theta[active] <= lower[active]) & (g > 0)) | (
+            (theta[active] >= upper[active]) & (g < 0)
+        )
+        free = ~held[:, :, None] & ~held[:, None, :]
+        identity = np.eye(len(fitted))
+        h = np.where(free, h, 0.0) + held[:, :, None] * identity
+        g = np.where(held, 0.0, g)
+
+        diagonal = np.einsum("kpp->kp", h) + 1e-12
+        system = h + damping[active, None, None] * diagonal[:, :, None] * identity
+        step = -np.linalg.solve(system, g[..., None])[..., 0]
+        # No value changes by more than a factor e per step, which keeps trial solves cheap
+        step /= np.maximum(np.abs(step).max(axis=1, keepdims=True), 1.0)
+        trial = np.clip(theta[active] + step, lower[active], upper[active])
+
+        trial_value, trial_gradient, trial_hessian = evaluate(active, trial)
+        iterations[active] += 1
+        better = trial_value < value[active]
+        improvement = value[active] - trial_value
+
+        accepted = active[better]
+        theta[accepted] = trial[better]
+        value[accepted] = trial_value[better]
+        gradient[accepted] = trial_gradient[better]
+        hessian[accepted] = trial_hessian[better]
+        damping[accepted] /= 10
+        damping[active[~better]] *= 10
+
+        # Done when steps stop paying off, or no damping makes a step pay off
+        small = np.abs(improvement) <= tolerance * (1 + np.abs(value[active]))
+        done = (better & small) | (damping[active] > 1e10)
+        converged[active[done]] = True
+        active = active[~done]
+
+    results = []
+    for i in range(k):
+        values = {name: start[name][i] for name in start}
+        values.update(zip(fitted, np.exp(theta[i])))
+        results.append(
+            {
+                "params": {name: float(values[name]) for name in PARAMS[model]},
+                "inits": initial_values(model, population[i], values[INITIAL]).tolist(),
+                "loss": float(value[i]),
+                "success": bool(converged[i]),
+                "iterations": int(iterations[i]),
+            }
+        )
+    return results
+
+
+def _observables(model, observed):
+    """
+    The compartments' coefficients in every observed series, as an (observed,
+    compartments) array, and which of the series are daily counts.
+    """
+    compartments = COMPARTMENTS[model]
+    names = [status.name.lower() for status in compartments]
+    combination = np.zeros((len(observed), len(compartments)))
+    daily = np.zeros(len(observed), dtype=bool)
+    for row, name in enumerate(observed):
+        if name in INCIDENCE:
+            daily[row] = True
+            for status, coefficient in INCIDENCE[name].items():
+                if status in compartments:
+                    combination[row, compartments.index(status)] = coefficient
+            if not combination[row].any():
+                raise ValueError(f"{model} has no {name}")
+        else:
+            name = name.name.lower() if isinstance(name, Status) else name
+            combination[row, names.index(name)] = 1
+    return combination, daily
+
+
+def _bounds(fitted, population):
+    """Lower and upper bounds of the fitted values of every fit, as (K, fitted) arrays."""
+    lower, upper = [], []
+    for name in fitted:
+        low, high = BOUNDS[name]
+        high = population if high is None else np.full_like(population, high)
+        factor = 1 / population if name == "beta" else 1
+        lower.append(low * factor * np.ones_like(population))
+        upper.append(high * factor)
+    return np.array(lower).T, np.array(upper).T
+
+
+def fit_batch(config, tasks):
+    """Fits a batch of (region, start) tasks in lockstep, in one worker."""
+    regions = [region for region, _ in tasks]
+    observed = {
+        name: np.array([config["observations"][region][name] for region in regions])
+        for name in config["observations"][regions[0]]
+    }
+    start = {name: np.array([start[name] for _, start in tasks]) for name in tasks[0][1]}
+    populations = np.array([config["populations"][region] for region in regions])
+    results = fit(
+        config["model"],
+        config["time_steps"],
+        observed,
+        populations,
+        start,
+        config["fitted"],
+        config["loss"],
+    )
+    return list(zip(regions, results))
+
+
+def calibrate(
+    model,
+    time_steps,
+    observations,
+    populations,
+    starts=8,
+    guess=None,
+    fitted=None,
+    loss="least_squares",
+    seed=None,
+    max_workers=None,
+    batch_size=None,
+):
+    """
+    Fits many regions, each a dict of observed series (see fit) with its population, from
+    several start points each, and keeps the best fit of every region. Fits run in
+    lockstep batches, spread across worker processes. Start points of the fitted values
+    are drawn log-uniformly from STARTS, reproducibly from seed; values that are not
+    fitted come from guess. Every region must observe the same series.
+    Returns the best fit of every region, in order.
+    """
+    fitted = tuple(fitted or (*PARAMS[model], INITIAL))
+    rng = np.random.default_rng(seed)
+    tasks = []
+    for region, population in enumerate(populations):
+        for _ in range(starts):
+            start = dict(guess or {})
+            for name in fitted:
+                low, high = np.log(STARTS[name])
+                start[name] = math.exp(rng.uniform(low, high))
+                if name == "beta":
+                    start[name] /= population
+            tasks.append((region, start))
+
+    config = {
+        "model": model,
+        "time_steps": np.asarray(time_steps, dtype=float),
+        "observations": list(observations),
+        "populations": list(populations),
+        "fitted": fitted,
+        "loss": loss,
+    }
+    # One batch per worker, lockstep fits share their solves
+    best = [None] * len(config["populations"])
+    batches = map_chunks(partial(fit_batch, config), tasks, max_workers, batch_size, 1)
+    for batch in batches:
+        for region, result in batch:
+            if best[region] is None or result["loss"] < best[region]["loss"]:
+                best[region] = result
+
+    return best
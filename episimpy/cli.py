@@ -2,7 +2,7 @@ from rich.console import Console
 from rich.table import Table
 from rich.prompt import Prompt, FloatPrompt, IntPrompt
 from core import Epidemic
-from simulation import run
+from models import SOLVERS
 
 # Create a console object for Rich
 console = Console()
@@ -44,8 +44,27 @@ def get_simulation_parameters() -> tuple[str, int, dict[str, float], int]:
     return model, population_size, params, duration
 
 
+def get_solver_options() -> dict[str, str | float]:
+    """Interactive prompts to choose the ODE solver and its tolerances."""
+
+    console.print("\n[bold]Enter Solver Options[/bold]", style="magenta")
+    method = Prompt.ask(
+        "ODE solver (LSODA, Radau or BDF for stiff systems)",
+        choices=list(SOLVERS),
+        default="RK45",
+    )
+    rtol = FloatPrompt.ask("Relative tolerance", default=1e-3)
+    atol = FloatPrompt.ask("Absolute tolerance", default=1e-6)
+
+    return {"method": method, "rtol": rtol, "atol": atol}
+
+
 def show_parameters_table(
-    model: str, population_size: int, params: dict[str, float], duration: int
+    model: str,
+    population_size: int,
+    params: dict[str, float],
+    duration: int,
+    solver: dict[str, str | float] | None = None,
 ) -> None:
     """Displays the parameters in a table."""
     table = Table(
@@ -64,11 +83,19 @@ def show_parameters_table(
         table.add_row("Mortality Rate (μ)", str(params["mu"]))
 
     table.add_row("Duration (Days)", str(duration))
+
+    if solver is not None:
+        table.add_row("Solver", str(solver["method"]))
+        table.add_row("Tolerances (rtol, atol)", f"{solver['rtol']}, {solver['atol']}")
     console.print(table)
 
 
 def prompt_and_run(
-    model: str, population_size: int, params: dict[str, float], duration: int
+    model: str,
+    population_size: int,
+    params: dict[str, float],
+    duration: int,
+    solver: dict[str, str | float] | None = None,
 ) -> None:
     """Prompts the user and runs the main program."""
     if (
@@ -81,10 +108,18 @@ def prompt_and_run(
         console.print("\n[bold green]Running plots...[/bold green]")
 
         # Run the epidemic simulation
-        epidemic = Epidemic(population_size, params, duration, model)
+        epidemic = Epidemic(population_size, params, duration, model, **(solver or {}))
         epidemic.run()
 
         console.print("[bold green]Plotting complete![/bold green]")
+        stats = epidemic.stats
+        if stats.get("cached"):
+            console.print(f"[cyan]{stats['method']}: served from the solution cache[/cyan]")
+        else:
+            console.print(
+                f"[cyan]{stats['method']}: {stats['nfev']} function and "
+                f"{stats['njev']} Jacobian evaluations[/cyan]"
+            )
     else:
         console.print("[bold red]Plotting aborted![/bold red]")
     
@@ -101,6 +136,9 @@ def prompt_and_run(
                 default="n",
             )
 
+        # Deferred, curses is only needed once the animation starts
+        from simulation import run
+
         if (sim_choice == "y".casefold()):
             run(population_size, params, duration, simtype)
         elif (sim_choice == "x".casefold()):
@@ -1,8 +1,9 @@
+from collections.abc import Sequence
 from enum import Enum
-from random import randint
+from functools import partial
 import numpy as np
-from models import SIR, SEIRD
-from visualisations import Plot
+from models import MODEL_SOLVERS
+from cache import default_cache
 
 
 # Custom enums for classes
@@ -31,15 +32,56 @@ class Groups(Enum):
     OLD = [1, '🧓']
 
 
+# Integer codes used by the array-backed population, in declaration order
+STATUSES = tuple(Status)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+GROUPS = tuple(Groups)
+
+# Compartments of each model, in the order the solvers return them
+COMPARTMENTS = {
+    "SIR": (Status.SUSCEPTIBLE, Status.INFECTIOUS, Status.RECOVERED),
+    "SEIRD": (
+        Status.SUSCEPTIBLE,
+        Status.EXPOSED,
+        Status.INFECTIOUS,
+        Status.RECOVERED,
+        Status.DEAD,
+    ),
+}
+
+# Upper age bound (inclusive) of every group except the last one
+AGE_BREAKPOINTS = np.array([5, 14, 24, 64])
+
+
+def age_group_codes(ages):
+    """Maps an array of ages to indices into GROUPS."""
+    return np.searchsorted(AGE_BREAKPOINTS, ages).astype(np.int8)
+
+
 class Individual:
-    """A single individual."""
+    """A single individual, a lightweight view over one row of a Population."""
 
-    def __init__(
-        self, age, status: Status=Status.SUSCEPTIBLE
-    ):  # Initially every individual is susceptible
-        self._age = age
-        self.age_group = self.age_group()
-        self.status = status
+    __slots__ = ("population", "index")
+
+    def __init__(self, population, index):
+        self.population = population
+        self.index = index
+
+    @property
+    def status(self) -> Status:
+        return STATUSES[self.population.status[self.index]]
+
+    @status.setter
+    def status(self, status: Status):
+        self.population.set_status(self.index, status)
+
+    @property
+    def age(self) -> int:
+        return int(self.population.age[self.index])
+
+    @property
+    def age_group(self) -> Groups:
+        return GROUPS[self.population.group[self.index]]
 
     def expose(self):
         """Individual is exposed."""
@@ -57,74 +99,222 @@ class Individual:
         """Individual dies."""
         self.status = Status.DEAD
 
-    # Helper functions
-    def age_group(self):
-        """Segregates individuals into age groups based on their age."""
-        if self._age > 64:
-            return Groups.OLD
-        elif self._age > 24:
-            return Groups.MIDDLE
-        elif self._age > 14:
-            return Groups.ADULTS
-        elif self._age > 5:
-            return Groups.TEENS
-        else:
-            return Groups.INFANTS
+    def __eq__(self, other):
+        return (
+            isinstance(other, Individual)
+            and self.population is other.population
+            and self.index == other.index
+        )
+
+    def __hash__(self):
+        return hash((id(self.population), self.index))
+
+
+class Individuals(Sequence):
+    """Sequence of Individual views over a Population, created on access."""
+
+    def __init__(self, population):
+        self._population = population
+
+    def __len__(self):
+        return len(self._population)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("individual index out of range")
+        return Individual(self._population, index)
 
 
 class Population:
-    """A collection of individuals."""
+    """
+    A collection of individuals, stored as one array per attribute (struct-of-arrays).
+    Row i of every array describes individual i.
+    """
 
-    def __init__(self, size):
+    def __init__(self, size, rng=None):
         self.size = size
-        self.individuals = self.segregate_population()
+        # Random number generator (or seed) that every random draw comes from
+        self.rng = np.random.default_rng(rng)
+        self.age = self.segregate_population()
+        self.group = age_group_codes(self.age)
+
+        n = len(self.age)
+        self.status = np.full(n, STATUS_CODES[Status.SUSCEPTIBLE], dtype=np.int8)
+        # Positions and velocities, filled in by the agent based simulation
+        self.x = np.zeros(n)
+        self.y = np.zeros(n)
+        self.vx = np.zeros(n)
+        self.vy = np.zeros(n)
+        # Pending timed transition of each individual: the tick it fires at (-1: none)
+        # and the status code it leads to
+        self.transition_tick = np.full(n, -1, dtype=np.int64)
+        self.next_status = np.full(n, -1, dtype=np.int8)
+
+        # Live number of individuals in each status, indexed by status code
+        self.counts = np.bincount(self.status, minlength=len(STATUSES))
+        # Optional per-tick history of the counts, see track_history()
+        self._history = None
+        self._ticks = 0
+
+        self.individuals = Individuals(self)
+
+    # Per individual arrays and counters that make up the state of a population
+    STATE = (
+        "age",
+        "group",
+        "status",
+        "x",
+        "y",
+        "vx",
+        "vy",
+        "transition_tick",
+        "next_status",
+        "counts",
+    )
+
+    def __len__(self):
+        return len(self.age)
+
+    def state(self):
+        """The population's state as a dict of flat arrays (not copies)."""
+        state = {name: getattr(self, name) for name in self.STATE}
+        if self.history is not None:
+            state["history"] = self.history
+        return state
+
+    @classmethod
+    def from_state(cls, state, size, rng=None):
+        """Rebuilds a population from (copies of) the arrays returned by state()."""
+        population = cls.__new__(cls)
+        population.size = size
+        population.rng = np.random.default_rng(rng)
+        for name in cls.STATE:
+            setattr(population, name, np.array(state[name]))
+
+        population._history = None
+        population._ticks = 0
+        if "history" in state:
+            history = np.array(state["history"])
+            population.track_history(max(len(history), 1))
+            population._history[: len(history)] = history
+            population._ticks = len(history)
+
+        population.individuals = Individuals(population)
+        return population
 
     def segregate_population(self):
         """
         Segregates population based on the different age groups
         Assumes the average approximate population segregation percentages as follows:
-        INFANTS: 7.5% ~ 8%, TEENS: 19%, ADULTS: 17.5% ~ 18%, MIDDLE-AGED: 45%, OLD-AGED: 11%
+        INFANTS: 7.5%, TEENS: 19%, ADULTS: 17.5%, MIDDLE-AGED: 45%, OLD-AGED: 11%
+        Every individual is assigned a group, the ones left over by rounding going to the
+        groups with the largest remainders, and all ages are drawn in a single call.
+        Returns the ages of the individuals, grouped by age group.
         """
-        percent_to_counts = (
-            int((p / 100) * self.size) for p in [7.5, 19, 17.5, 45, 11]
-        )
-        limits = ([1, 5], [6, 14], [15, 24], [25, 65], [66, 90])
+        shares = np.array([7.5, 19, 17.5, 45, 11]) / 100 * self.size
+        counts = np.floor(shares).astype(np.intp)
+        left_over = self.size - counts.sum()
+        counts[np.argsort(counts - shares, kind="stable")[:left_over]] += 1
 
-        population = []
+        # Age ranges of the groups, matching AGE_BREAKPOINTS
+        low = np.repeat(np.array([1, 6, 15, 25, 65], dtype=np.int16), counts)
+        high = np.repeat(np.array([5, 14, 24, 64, 90], dtype=np.int16), counts)
+        return self.rng.integers(low, high, endpoint=True, dtype=np.int16)
 
-        for count, limit in zip(percent_to_counts, limits):
-            group = [Individual(randint(*limit)) for _ in range(count)]
-            population.extend(group)
-
-        return population
+    def set_status(self, indices, status: Status):
+        """
+        Moves individuals to a new status, keeping the counters up to date.
+        indices is a single index or an array of unique indices.
+        """
+        indices = np.atleast_1d(indices)
+        code = STATUS_CODES[status]
+        self.counts -= np.bincount(self.status[indices], minlength=len(STATUSES))
+        self.counts[code] += len(indices)
+        self.status[indices] = code
 
     def get_counts(self):
         """Get the count of individuals in each state at any point."""
-        s_count = sum(1 for i in self.individuals if i.status == Status.SUSCEPTIBLE)
-        i_count = sum(1 for i in self.individuals if i.status == Status.INFECTIOUS)
-        r_count = sum(1 for i in self.individuals if i.status == Status.RECOVERED)
-        e_count = sum(1 for i in self.individuals if i.status == Status.EXPOSED)
-        d_count = sum(1 for i in self.individuals if i.status == Status.DEAD)
+        # Status codes follow the declaration order S, E, I, R, D
+        s_count, e_count, i_count, r_count, d_count = (int(c) for c in self.counts)
 
         return s_count, i_count, r_count, e_count, d_count
 
+    def group_counts(self):
+        """
+        Count of individuals in each status (rows, by status code) and age group (columns,
+        like GROUPS), e.g. the initial values of the age-structured models.
+        """
+        cells = self.status.astype(np.intp) * len(GROUPS) + self.group
+        return np.bincount(cells, minlength=len(STATUSES) * len(GROUPS)).reshape(
+            len(STATUSES), len(GROUPS)
+        )
+
+    def track_history(self, capacity=1024):
+        """Starts keeping a history of the counts, appended to by record()."""
+        self._history = np.empty((capacity, len(STATUSES)), dtype=self.counts.dtype)
+        self._ticks = 0
+
+    def record(self):
+        """Appends the current counts to the history, if it is being tracked."""
+        if self._history is None:
+            return
+        if self._ticks == len(self._history):  # Grow the buffer geometrically
+            self._history = np.concatenate((self._history, np.empty_like(self._history)))
+        self._history[self._ticks] = self.counts
+        self._ticks += 1
+
+    @property
+    def history(self):
+        """
+        Recorded counts as a (ticks, statuses) array, with columns in status code order
+        (S, E, I, R, D), or None when the history is not tracked.
+        """
+        if self._history is None:
+            return None
+        return self._history[: self._ticks]
+
 
 class Epidemic:
     """
     Simulates an epidemic.
     """
 
-    def __init__(self, population_size, params, duration, model="SIR"):
-        self.population = Population(population_size)
+    def __init__(
+        self,
+        population_size,
+        params,
+        duration,
+        model="SIR",
+        method="RK45",
+        rtol=1e-3,
+        atol=1e-6,
+        cache=default_cache,
+        rng=None,
+    ):
+        # Random number generator (or seed) shared by the population and simulations
+        self.rng = np.random.default_rng(rng)
+        self.seed = None if isinstance(rng, np.random.Generator) else rng
+        self.population = Population(population_size, self.rng)
         self.params = params
         self.duration = duration
         self.model = model
+        # ODE solver options, and the statistics of the last solve
+        self.solver = {"method": method, "rtol": rtol, "atol": atol}
+        self.stats = None
+        # Solution cache to solve through, None to always solve afresh
+        self.cache = cache
         # Initially, one individual is infectious
-        self.population.individuals[randint(0, self.population.size)].infect()
+        self.population.individuals[int(self.rng.integers(len(self.population)))].infect()
 
-    def run(self):
+    def solve(self, sink=None):
         """
-        Run the epidemic simulation.
+        Solve the epidemic model without plotting.
+        Returns the compartment series, in the model's order, and the time steps.
+        The series are also written to sink (a ResultWriter) when one is given.
         """
 
         s_count, i_count, r_count, e_count, d_count = self.population.get_counts()
@@ -136,18 +326,32 @@ class Epidemic:
         # Take varying time points
         time_points = np.arange(0, self.duration + 0.1, 0.1)
 
-        # Solve the SIR model
-        if self.model == "SIR":
-            S, I, R, time_steps = SIR.solve_sir(inits, self.params, time_points)
-            # Plot the epidemic curve
-            Plot.window([S, I, R], self.model, time_steps)
-            Plot.terminal([S, I, R], self.model, time_steps)
+        # Solve the model, through the cache when there is one
+        if self.cache is None:
+            solve = MODEL_SOLVERS[self.model]
+        else:
+            solve = partial(self.cache.solve, self.model)
 
-        elif self.model == "SEIRD":
-            S, E, I, R, D, time_steps = SEIRD.solve_seird(
-                inits, self.params, time_points
-            )
+        *values, time_steps, self.stats = solve(
+            inits, self.params, time_points, **self.solver, full_output=True
+        )
+
+        if sink is not None:
+            sink.metadata.update(params=self.params, seed=self.seed, solver=self.stats)
+            sink.write(time_steps, values)
 
-            Plot.window([S, E, I, R, D], self.model, time_steps)
-            # Plot.terminal([S, E, I, R, D], self.model, time_steps)
+        return values, time_steps
 
+    def run(self, sink=None):
+        """
+        Run the epidemic simulation.
+        """
+        # Deferred, the plotting backends are slow to import and only needed here
+        from visualisations import Plot
+
+        values, time_steps = self.solve(sink)
+
+        # Plot the epidemic curve
+        Plot.window(values, self.model, time_steps)
+        if self.model == "SIR":
+            Plot.terminal(values, self.model, time_steps)
@@ -1,8 +1,66 @@
+import argparse, sys
+
+parser = argparse.ArgumentParser(
+    description="Compartmental models in epidemiology. Without --no-plot, asks for "
+    "the parameters interactively and plots the solution."
+)
+parser.add_argument(
+    "--no-plot",
+    action="store_true",
+    help="solve non-interactively and print the series as CSV instead of plotting",
+)
+parser.add_argument("--model", choices=["SIR", "SEIRD"], default="SIR")
+parser.add_argument("--population", type=int, default=500)
+parser.add_argument("--duration", type=int, default=100)
+parser.add_argument("--beta", type=float, default=0.001)
+parser.add_argument("--gamma", type=float, default=0.1)
+parser.add_argument("--sigma", type=float, default=0.2)
+parser.add_argument("--mu", type=float, default=0.01)
+parser.add_argument("--method", choices=["RK45", "LSODA", "Radau", "BDF"], default="RK45")
+parser.add_argument("--rtol", type=float, default=1e-3)
+parser.add_argument("--atol", type=float, default=1e-6)
+parser.add_argument("--seed", type=int, help="seed of the initially infectious individual")
+parser.add_argument("--output", help="save the series to this directory instead of printing them")
+args = parser.parse_args()
+
+if args.no_plot:
+    # Fast path for scripted runs: neither the prompts nor any plotting backend is imported
+    import numpy as np
+    from core import Epidemic, COMPARTMENTS
+    from results import ResultWriter
+
+    params = {"beta": args.beta, "gamma": args.gamma}
+    if args.model == "SEIRD":
+        params.update(sigma=args.sigma, mu=args.mu)
+    epidemic = Epidemic(
+        args.population,
+        params,
+        args.duration,
+        args.model,
+        method=args.method,
+        rtol=args.rtol,
+        atol=args.atol,
+        rng=args.seed,
+    )
+
+    if args.output:
+        with ResultWriter(args.output, args.model) as sink:
+            epidemic.solve(sink)
+    else:
+        values, time_steps = epidemic.solve()
+        header = ",".join(["time", *(status.name.lower() for status in COMPARTMENTS[args.model])])
+        np.savetxt(
+            sys.stdout, np.column_stack([time_steps, *values]), delimiter=",",
+            header=header, comments="", fmt="%.6g",
+        )
+    sys.exit()
+
 # Importing necessary functions for the cli
 from cli import (
     display_banner,
     show_parameters_table,
     get_simulation_parameters,
+    get_solver_options,
     prompt_and_run,
 )
 
@@ -11,11 +69,10 @@ display_banner()
 
 # Get user inputs for parameters
 model, population_size, params, duration = get_simulation_parameters()
+solver = get_solver_options()
 
 # Confirm and run simulation
-prompt_and_run(model, population_size, params, duration)
+prompt_and_run(model, population_size, params, duration, solver)
 
 # Display the parameters back to the user
-show_parameters_table(model, population_size, params, duration)
-
-
+show_parameters_table(model, population_size, params, duration, solver)
@@ -0,0 +1,259 @@
+import math
+import numpy as np
+from scipy import sparse
+from scipy.integrate import BDF, Radau
+from scipy.sparse.linalg import gmres
+from core import Status, COMPARTMENTS
+from models import SIR, SEIRD, solve
+from stochastic import REACTIONS
+
+# Well-mixed dynamics within a patch and their Jacobians, evaluated on
+# (compartments, patches) states
+PATCH_MODELS = {"SIR": SIR.sir_model, "SEIRD": SEIRD.seird_model}
+PATCH_JACOBIANS = {"SIR": SIR.jacobian, "SEIRD": SEIRD.jacobian}
+
+
+class BlockKrylov:
+    """
+    Makes BDF or Radau solve the linear systems of their Newton iterations by GMRES,
+    preconditioned by the inverses of the systems' diagonal blocks of size block, in
+    place of a sparse LU. Every iteration costs time in the number of non-zeros, while
+    an LU's fill-in grows with the coupling graph, quadratically on random graphs.
+    """
+
+    def __init__(self, fun, t0, y0, t_bound, block=1, **options):
+        super().__init__(fun, t0, y0, t_bound, **options)
+        self.block = block
+        cells = np.arange(len(y0)).reshape(-1, block)
+        self._rows = np.repeat(cells, block, axis=1).ravel()
+        self._cols = np.tile(cells, (1, block)).ravel()
+        self.lu, self.solve_lu = self._factor, self._solve
+
+    def _factor(self, A):
+        """The system and its block-Jacobi preconditioner, as a block diagonal matrix."""
+        self.nlu += 1
+        A = sparse.csr_matrix(A)
+        blocks = np.asarray(A[self._rows, self._cols]).reshape(-1, self.block, self.block)
+        inverse = np.linalg.inv(blocks)
+        indptr = np.arange(0, inverse.size + 1, self.block)
+        return A, sparse.csr_matrix((inverse.ravel(), self._cols, indptr), shape=A.shape)
+
+    def _solve(self, factors, b):
+        # The Newton iteration tolerates, and checks for, an inexact solution
+        A, preconditioner = factors
+        x, _ = gmres(A, b, M=preconditioner, rtol=1e-8, atol=0.0, restart=30, maxiter=10)
+        return x
+
+
+class KrylovBDF(BlockKrylov, BDF):
+    """BDF with BlockKrylov linear solves."""
+
+
+class KrylovRadau(BlockKrylov, Radau):
+    """Radau with BlockKrylov linear solves."""
+
+
+KRYLOV_SOLVERS = {"BDF": KrylovBDF, "Radau": KrylovRadau}
+
+
+class Metapopulation:
+    """
+    An SIR or SEIRD epidemic in many patches (regions), well mixed within each patch and
+    coupled by movement between them. mobility is a sparse (patches, patches) matrix of
+    per capita rates: mobility[i, j] is the rate at which individuals in patch j move to
+    patch i. The living move, the dead stay put. Parameters are scalars or per patch
+    arrays. Every evaluation costs time in the number of patches plus non-zero flows.
+    """
+
+    def __init__(self, model, mobility):
+        self.model = model
+        self.compartments = COMPARTMENTS[model]
+        mobility = sparse.csc_matrix(mobility, dtype=float)
+        mobility = sparse.csc_matrix(mobility - sparse.diags(mobility.diagonal()))
+        mobility.eliminate_zeros()
+        mobility.sort_indices()
+        self.mobility = mobility
+        self.patches = mobility.shape[0]
+        # Total rate of leaving every patch, and the generator of movement
+        self.outflow = np.asarray(mobility.sum(axis=0)).ravel()
+        self.laplacian = (mobility - sparse.diags(self.outflow)).tocsr()
+        self.mobile = np.array([status != Status.DEAD for status in self.compartments])
+        self._jacobian_pattern = None
+
+        # Flows grouped by their position among the flows out of their patch: the k-th
+        # group holds every patch's k-th flow, whose sources are all distinct
+        counts = np.diff(mobility.indptr)
+        self._sources = np.repeat(np.arange(self.patches), counts)
+        position = np.arange(mobility.nnz) - mobility.indptr[self._sources]
+        order = np.argsort(position, kind="stable")
+        self._positions = np.split(order, np.cumsum(np.bincount(position))[:-1])
+
+        # Share of the individuals leaving a patch, and not taken by its earlier flows,
+        # that each flow takes; the last takes everyone left
+        cumulative = np.concatenate([[0.0], np.cumsum(mobility.data)])
+        earlier = cumulative[:-1] - cumulative[mobility.indptr[self._sources]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shares = mobility.data / (self.outflow[self._sources] - earlier)
+        last = position == counts[self._sources] - 1
+        self._shares = np.where(last, 1.0, np.clip(shares, 0, 1))
+        # Adds up the individuals taking every flow into the flows' destinations
+        self._arrivals = sparse.csr_matrix(
+            (np.ones(mobility.nnz, dtype=np.int64), (mobility.indices, np.arange(mobility.nnz))),
+            shape=(self.patches, mobility.nnz),
+        )
+
+    def model_function(self, t, y, params):
+        """
+        Right hand side on the flattened state, patch by patch: the compartments of a
+        patch are contiguous, which keeps the Jacobian's within patch blocks on its
+        diagonal.
+        """
+        x = y.reshape(self.patches, len(self.compartments)).T
+        dx = np.array(PATCH_MODELS[self.model](t, x, params), dtype=float)
+        dx[self.mobile] += (self.laplacian @ x[self.mobile].T).T
+        return dx.T.ravel()
+
+    def jacobian(self, t, y, params):
+        """
+        Analytical Jacobian of model_function, as a sparse CSC matrix: the within patch
+        blocks on the diagonal and, for the mobile compartments, the movement generator.
+        It has as many non-zeros as the blocks' non-zero entries plus the flows.
+        """
+        rows, cols, block, moving = self._pattern(params)
+        x = y.reshape(self.patches, len(self.compartments)).T
+        blocks = PATCH_JACOBIANS[self.model](t, x, params)[block]
+        blocks = np.broadcast_to(blocks, (len(block[0]), self.patches))
+        data = np.concatenate([blocks.T.ravel(), moving])
+        size = self.patches * len(self.compartments)
+        return sparse.csc_matrix((data, (rows, cols)), shape=(size, size))
+
+    def _pattern(self, params):
+        """
+        Rows and columns of the Jacobian's non-zeros, which entries of a patch's block
+        are among them, and the movement generator's values, computed once.
+        """
+        if self._jacobian_pattern is not None:
+            return self._jacobian_pattern
+
+        # Entries of a block that do not vanish at a generic positive state
+        generic = np.random.default_rng(0).uniform(1, 2, len(self.compartments) + len(params))
+        values = dict(zip(params, generic[len(self.compartments) :]))
+        state = generic[: len(self.compartments)]
+        block = np.nonzero(PATCH_JACOBIANS[self.model](0, state, values))
+
+        count = len(self.compartments)
+        offsets = np.arange(self.patches)[:, None] * count
+        generator = self.laplacian.tocoo()
+        mobile = np.flatnonzero(self.mobile)
+        rows = np.concatenate(
+            [(offsets + block[0]).ravel(), (generator.row[:, None] * count + mobile).ravel()]
+        )
+        cols = np.concatenate(
+            [(offsets + block[1]).ravel(), (generator.col[:, None] * count + mobile).ravel()]
+        )
+        moving = np.repeat(generator.data, len(mobile))
+        self._jacobian_pattern = rows, cols, block, moving
+        return self._jacobian_pattern
+
+    def solve(
+        self, inits, params, time_steps, method="RK45", rtol=1e-3, atol=1e-6, full_output=False
+    ):
+        """
+        Solves the coupled equations from (compartments, patches) initial values.
+        Radau and BDF get the analytical sparse Jacobian and solve their linear systems
+        with BlockKrylov, so every step costs time in the number of patches plus non-zero
+        flows, like RK45's. LSODA only handles dense Jacobians, so it estimates one by
+        finite differences if it turns stiff, which is slow beyond a few hundred patches.
+        Returns a (compartments, patches, T) array and the time steps, and with full_output
+        the solver statistics as well.
+        """
+        inits = np.asarray(inits, dtype=float)
+        options = {}
+        if method in KRYLOV_SOLVERS:
+            options = {"solver": KRYLOV_SOLVERS[method], "block": len(self.compartments)}
+        result, stats = solve(
+            self.model_function,
+            None if method == "LSODA" else self.jacobian,
+            inits.T.ravel(),
+            params,
+            time_steps,
+            method,
+            rtol,
+            atol,
+            **options,
+        )
+        values = result.y.reshape(self.patches, len(self.compartments), -1).transpose(1, 0, 2)
+        if full_output:
+            return values, result.t, stats
+        return values, result.t
+
+    def simulate(self, inits, params, time_steps, dt=0.1, rng=None):
+        """
+        Stochastic counterpart of solve, in steps of at most dt. Within a step, each
+        individual leaves its compartment with the probability implied by the rates of the
+        reactions in stochastic.REACTIONS, then moves to another patch with the probability
+        implied by the mobility rates; competing outcomes are split multinomially.
+        Returns the integer counts as a (compartments, patches, T) array.
+        """
+        rng = np.random.default_rng(rng)
+        x = np.array(inits, dtype=np.int64)
+        out = np.empty((*x.shape, len(time_steps)), dtype=np.int64)
+        out[..., 0] = x
+
+        for k in range(1, len(time_steps)):
+            interval = time_steps[k] - time_steps[k - 1]
+            steps = max(math.ceil(interval / dt - 1e-9), 1)
+            for _ in range(steps):
+                self._react(x, params, interval / steps, rng)
+                self._move(x, interval / steps, rng)
+            out[..., k] = x
+        return out
+
+    def _react(self, x, params, step, rng):
+        """One step of the within patch reactions, in place."""
+        stoichiometry, propensities = REACTIONS[self.model]
+        rates = propensities(x.astype(float), params)
+        sources = np.argmax(stoichiometry < 0, axis=1)
+        targets = np.argmax(stoichiometry > 0, axis=1)
+
+        change = np.zeros_like(x)
+        for source in np.unique(sources):
+            reactions = np.flatnonzero(sources == source)
+            total = rates[reactions].sum(axis=0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                hazard = np.where(x[source] > 0, total / x[source], 0.0)
+            leaving = rng.binomial(x[source], -np.expm1(-hazard * step))
+
+            # Split the individuals leaving between the competing reactions
+            remaining, weight = leaving, total
+            for position, reaction in enumerate(reactions):
+                if position == len(reactions) - 1:
+                    fired = remaining
+                else:
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        share = np.where(weight > 0, rates[reaction] / weight, 0.0)
+                    fired = rng.binomial(remaining, np.clip(share, 0, 1))
+                remaining = remaining - fired
+                weight = weight - rates[reaction]
+                change[source] -= fired
+                change[targets[reaction]] += fired
+        x += change
+
+    def _move(self, x, step, rng):
+        """
+        One step of movement between patches, in place. The individuals leaving a patch
+        are split over its flows by conditional binomial draws, one flow at a time, so a
+        step costs time in the number of flows whatever the number of individuals.
+        """
+        if not self.mobility.nnz:
+            return
+        leaving = rng.binomial(x[self.mobile], -np.expm1(-self.outflow * step))
+        x[self.mobile] -= leaving
+
+        moved = np.empty((len(leaving), self.mobility.nnz), dtype=np.int64)
+        remaining = leaving
+        for flows in self._positions:
+            sources = self._sources[flows]
+            moved[:, flows] = rng.binomial(remaining[:, sources], self._shares[flows])
+            remaining[:, sources] -= moved[:, flows]
+        x[self.mobile] += (self._arrivals @ moved.T).T
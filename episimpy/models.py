@@ -1,4 +1,74 @@
 from scipy.integrate import solve_ivp  # To solve differential equations
+import numpy as np
+
+# Methods accepted by the solvers, the implicit ones make use of the Jacobian
+SOLVERS = ("RK45", "LSODA", "Radau", "BDF")
+IMPLICIT_SOLVERS = ("LSODA", "Radau", "BDF")
+
+
+def solve(
+    model,
+    jacobian,
+    inits,
+    params,
+    time_steps,
+    method="RK45",
+    rtol=1e-3,
+    atol=1e-6,
+    solver=None,
+    **options,
+):
+    """
+    Solves a compartment model with solve_ivp.
+    The analytical Jacobian is handed to the implicit methods, which stiff systems need.
+    solver, an OdeSolver class, integrates in place of method's own, e.g. to solve the
+    implicit methods' linear systems differently; options are passed on to it.
+    Returns the solve_ivp result and a dict of solver statistics.
+    """
+    if method in IMPLICIT_SOLVERS and jacobian is not None:
+        options["jac"] = lambda t, y: jacobian(t, y, params)
+
+    result = solve_ivp(
+        fun=lambda t, y: model(t, y, params),
+        t_span=(time_steps[0], time_steps[-1]),
+        y0=inits,
+        t_eval=time_steps,
+        method=method if solver is None else solver,
+        rtol=rtol,
+        atol=atol,
+        **options,
+    )
+    stats = {
+        "method": method,
+        "success": bool(result.success),
+        "nfev": int(result.nfev),
+        "njev": int(result.njev),
+        "nlu": int(result.nlu),
+    }
+    return result, stats
+
+
+def solve_ensemble(model, inits, params, time_steps):
+    """
+    Solves K scenarios of a compartment model together, as one system.
+    inits is a (K, compartments) array and every parameter is a scalar or a length K array.
+    The model's right hand side is evaluated once for all K scenarios, on (compartments, K)
+    states. Returns a (K, compartments, T) array of solutions and the time steps.
+    """
+    inits = np.asarray(inits, dtype=float)
+    k, compartments = inits.shape
+    params = {
+        name: np.broadcast_to(np.asarray(value, dtype=float), (k,))
+        for name, value in params.items()
+    }
+
+    result = solve_ivp(
+        fun=lambda t, y: np.ravel(model(t, y.reshape(compartments, k), params)),
+        t_span=(time_steps[0], time_steps[-1]),
+        y0=inits.T.ravel(),
+        t_eval=time_steps,
+    )
+    return result.y.reshape(compartments, k, -1).transpose(1, 0, 2), result.t
 
 
 class SIR:
@@ -28,19 +98,72 @@ class SIR:
         return [dS, dI, dR]
 
     @staticmethod
-    def solve_sir(inits: list[int], params: dict[str, float], time_steps: list[float]):
+    def jacobian(t: float, x: list[float], params: dict[str, float]) -> np.ndarray:
+        """
+        Jacobian of the SIR differential equations with respect to S, I, R.
+        On (3, K) states it is evaluated for every scenario, as a (3, 3, K) array.
+        """
+        S, I, R = x
+        beta = params["beta"]
+        gamma = params["gamma"]
+        zero = np.zeros_like(S * beta * gamma)
+
+        return np.array(
+            [
+                [-beta * I, -beta * S, zero],
+                [beta * I, beta * S - gamma, zero],
+                [zero, gamma + zero, zero],
+            ]
+        )
+
+    @staticmethod
+    def parameter_jacobian(t: float, x: list[float], params: dict[str, float]) -> np.ndarray:
+        """
+        Derivatives of the SIR differential equations with respect to beta and gamma.
+        On (3, K) states it is evaluated for every scenario, as a (3, 2, K) array.
+        """
+        S, I, R = x
+        zero = np.zeros_like(S * I)
+
+        return np.array(
+            [
+                [-S * I, zero],
+                [S * I, -I],
+                [zero, I],
+            ]
+        )
+
+    @staticmethod
+    def solve_sir(
+        inits: list[int],
+        params: dict[str, float],
+        time_steps: list[float],
+        method: str = "RK45",
+        rtol: float = 1e-3,
+        atol: float = 1e-6,
+        full_output: bool = False,
+    ):
         """
         Solves the SIR differential equations.
+        With full_output, the solver statistics (function and Jacobian evaluations) are
+        returned as well.
         """
-        result = solve_ivp(
-            fun=lambda t, y: SIR.sir_model(t, y, params),
-            t_span=(time_steps[0], time_steps[-1]),
-            y0=inits,
-            t_eval=time_steps,
+        result, stats = solve(
+            SIR.sir_model, SIR.jacobian, inits, params, time_steps, method, rtol, atol
         )
         S, I, R = result.y
+        if full_output:
+            return S, I, R, result.t, stats
         return S, I, R, result.t
 
+    @staticmethod
+    def solve_sir_ensemble(inits, params, time_steps):
+        """
+        Solves the SIR differential equations for many parameter sets at once.
+        Returns a (K, 3, T) array of S, I, R and the time steps.
+        """
+        return solve_ensemble(SIR.sir_model, inits, params, time_steps)
+
 
 class SEIRD:
     @staticmethod
@@ -62,17 +185,203 @@ class SEIRD:
         return [dS, dE, dI, dR, dD]
 
     @staticmethod
-    def solve_seird(inits, params, time_steps):
+    def jacobian(t, x, params):
+        """
+        Jacobian of the SEIRD differential equations with respect to S, E, I, R, D.
+        On (5, K) states it is evaluated for every scenario, as a (5, 5, K) array.
+        """
+        S, E, I, R, D = x
+        beta = params["beta"]
+        sigma = params["sigma"]
+        gamma = params["gamma"]
+        mu = params["mu"]
+        zero = np.zeros_like(S * beta * sigma * gamma * mu)
+
+        return np.array(
+            [
+                [-beta * I, zero, -beta * S, zero, zero],
+                [beta * I, zero - sigma, beta * S, zero, zero],
+                [zero, sigma + zero, -gamma - mu + zero, zero, zero],
+                [zero, zero, gamma + zero, zero, zero],
+                [zero, zero, mu + zero, zero, zero],
+            ]
+        )
+
+    @staticmethod
+    def parameter_jacobian(t, x, params):
+        """
+        Derivatives of the SEIRD differential equations with respect to beta, sigma,
+        gamma and mu. On (5, K) states it is evaluated for every scenario, as a (5, 4, K)
+        array.
+        """
+        S, E, I, R, D = x
+        zero = np.zeros_like(S * E * I)
+
+        return np.array(
+            [
+                [-S * I, zero, zero, zero],
+                [S * I, -E, zero, zero],
+                [zero, E, -I, -I],
+                [zero, zero, I, zero],
+                [zero, zero, zero, I],
+            ]
+        )
+
+    @staticmethod
+    def solve_seird(
+        inits, params, time_steps, method="RK45", rtol=1e-3, atol=1e-6, full_output=False
+    ):
         """
         Solves the SEIRD differential equations.
+        With full_output, the solver statistics (function and Jacobian evaluations) are
+        returned as well.
         """
         # Solve the equations using scipy's solve_ivp
-        result = solve_ivp(
-            fun=lambda t, y: SEIRD.seird_model(t, y, params),
-            t_span=(time_steps[0], time_steps[-1]),
-            y0=inits,
-            t_eval=time_steps,
+        result, stats = solve(
+            SEIRD.seird_model, SEIRD.jacobian, inits, params, time_steps, method, rtol, atol
         )
 
         S, E, I, R, D = result.y
+        if full_output:
+            return S, E, I, R, D, result.t, stats
         return S, E, I, R, D, result.t
+
+    @staticmethod
+    def solve_seird_ensemble(inits, params, time_steps):
+        """
+        Solves the SEIRD differential equations for many parameter sets at once.
+        Returns a (K, 5, T) array of S, E, I, R, D and the time steps.
+        """
+        return solve_ensemble(SEIRD.seird_model, inits, params, time_steps)
+
+
+class AgeSIR:
+    """
+    The SIR Model stratified by age group (e.g. the Groups of core, in their order).
+    Susceptibles of group a are infected at rate beta * sum_b C[a, b] * I[b], where the
+    contact matrix C = params["contacts"] scales mixing between groups; a matrix of ones
+    mixes everyone alike and reduces to SIR. States are (3, groups) arrays.
+    """
+
+    @staticmethod
+    def age_sir_model(t, x, params):
+        """
+        Differential equations of the age-structured SIR model, on the flattened state.
+        """
+        S, I, R = np.reshape(x, (3, -1))
+        force = params["beta"] * (np.asarray(params["contacts"]) @ I)
+        gamma = params["gamma"]
+
+        dS = -S * force
+        dI = S * force - gamma * I
+        dR = gamma * I
+        return np.concatenate([dS, dI, dR])
+
+    @staticmethod
+    def jacobian(t, x, params):
+        """
+        Jacobian of the age-structured SIR equations, blocks ordered like the state.
+        """
+        S, I, R = np.reshape(x, (3, -1))
+        contacts = params["beta"] * np.asarray(params["contacts"])
+        force = contacts @ I
+        identity = np.eye(len(S))
+        zero = np.zeros_like(identity)
+
+        return np.block(
+            [
+                [-np.diag(force), -S[:, None] * contacts, zero],
+                [np.diag(force), S[:, None] * contacts - params["gamma"] * identity, zero],
+                [zero, params["gamma"] * identity, zero],
+            ]
+        )
+
+    @staticmethod
+    def solve_age_sir(
+        inits, params, time_steps, method="RK45", rtol=1e-3, atol=1e-6, full_output=False
+    ):
+        """
+        Solves the age-structured SIR equations from (3, groups) initial values.
+        Returns S, I, R as (groups, T) arrays and the time steps, and with full_output the
+        solver statistics as well.
+        """
+        inits = np.asarray(inits, dtype=float)
+        result, stats = solve(
+            AgeSIR.age_sir_model, AgeSIR.jacobian, inits.ravel(), params, time_steps,
+            method, rtol, atol,
+        )
+        S, I, R = result.y.reshape(*inits.shape, -1)
+        if full_output:
+            return S, I, R, result.t, stats
+        return S, I, R, result.t
+
+
+class AgeSEIRD:
+    """
+    The SEIRD Model stratified by age group, mixing through a contact matrix like AgeSIR.
+    sigma, gamma and mu may be scalars or per group arrays. States are (5, groups) arrays.
+    """
+
+    @staticmethod
+    def age_seird_model(t, x, params):
+        """
+        Differential equations of the age-structured SEIRD model, on the flattened state.
+        """
+        S, E, I, R, D = np.reshape(x, (5, -1))
+        force = params["beta"] * (np.asarray(params["contacts"]) @ I)
+        sigma, gamma, mu = params["sigma"], params["gamma"], params["mu"]
+
+        dS = -S * force
+        dE = S * force - sigma * E
+        dI = sigma * E - (gamma + mu) * I
+        dR = gamma * I
+        dD = mu * I
+        return np.concatenate([dS, dE, dI, dR, dD])
+
+    @staticmethod
+    def jacobian(t, x, params):
+        """
+        Jacobian of the age-structured SEIRD equations, blocks ordered like the state.
+        """
+        S, E, I, R, D = np.reshape(x, (5, -1))
+        contacts = params["beta"] * np.asarray(params["contacts"])
+        force = contacts @ I
+        groups = len(S)
+        zero = np.zeros((groups, groups))
+
+        def diag(rate):
+            return np.diag(np.broadcast_to(rate, groups).astype(float))
+
+        sigma, gamma, mu = params["sigma"], params["gamma"], params["mu"]
+        return np.block(
+            [
+                [-np.diag(force), zero, -S[:, None] * contacts, zero, zero],
+                [np.diag(force), -diag(sigma), S[:, None] * contacts, zero, zero],
+                [zero, diag(sigma), -diag(np.add(gamma, mu)), zero, zero],
+                [zero, zero, diag(gamma), zero, zero],
+                [zero, zero, diag(mu), zero, zero],
+            ]
+        )
+
+    @staticmethod
+    def solve_age_seird(
+        inits, params, time_steps, method="RK45", rtol=1e-3, atol=1e-6, full_output=False
+    ):
+        """
+        Solves the age-structured SEIRD equations from (5, groups) initial values.
+        Returns S, E, I, R, D as (groups, T) arrays and the time steps, and with
+        full_output the solver statistics as well.
+        """
+        inits = np.asarray(inits, dtype=float)
+        result, stats = solve(
+            AgeSEIRD.age_seird_model, AgeSEIRD.jacobian, inits.ravel(), params, time_steps,
+            method, rtol, atol,
+        )
+        S, E, I, R, D = result.y.reshape(*inits.shape, -1)
+        if full_output:
+            return S, E, I, R, D, result.t, stats
+        return S, E, I, R, D, result.t
+
+
+# Solver of each model, by name
+MODEL_SOLVERS = {"SIR": SIR.solve_sir, "SEIRD": SEIRD.solve_seird}
@@ -0,0 +1,163 @@
+from functools import partial
+import math
+import numpy as np
+from core import Status, COMPARTMENTS
+from simulation import Simulation
+from stochastic import gillespie, tau_leap
+from sweep import map_chunks
+
+# Well-mixed stochastic engines, the agent simulation is the "agent" engine
+ENGINES = {"gillespie": gillespie, "tau_leap": tau_leap}
+
+
+class StreamingSummary:
+    """
+    Per tick summary of replicate trajectories that never holds the replicates themselves.
+    Mean and variance are updated exactly (Chan et al.'s parallel form of Welford's
+    algorithm) and quantiles are read from per tick histograms over [0, upper]. The
+    first bin holds [0, 1) and the others are log-spaced up to upper, so quantiles are
+    exact to within a fraction resolution of their value, small counts included.
+    Summaries of separate batches can be merged.
+    """
+
+    def __init__(self, shape, upper, bins=256):
+        self.shape = tuple(shape)  # (compartments, ticks)
+        self.upper = upper
+        self.bins = bins
+        self.edges = np.concatenate([[0.0], np.geomspace(1, max(upper, 2), bins)])
+        self.count = 0
+        self.mean = np.zeros(self.shape)
+        self._m2 = np.zeros(self.shape)  # Sum of squared deviations from the mean
+        self._histogram = np.zeros((*self.shape, bins), dtype=np.int64)
+
+    def add(self, trajectories):
+        """Adds a (replicates, compartments, ticks) batch of trajectories."""
+        trajectories = np.asarray(trajectories, dtype=float)
+        batch = StreamingSummary(self.shape, self.upper, self.bins)
+        batch.count = len(trajectories)
+        batch.mean = trajectories.mean(axis=0)
+        batch._m2 = ((trajectories - batch.mean) ** 2).sum(axis=0)
+
+        bins = np.searchsorted(self.edges, trajectories, side="right") - 1
+        bins = np.clip(bins, 0, self.bins - 1)
+        cells = np.arange(math.prod(self.shape)).reshape(self.shape) * self.bins
+        batch._histogram += np.bincount(
+            (cells + bins).ravel(), minlength=batch._histogram.size
+        ).reshape(batch._histogram.shape)
+
+        self.merge(batch)
+
+    def merge(self, other):
+        """Folds another summary of the same shape into this one."""
+        total = self.count + other.count
+        if not total:
+            return
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / total
+        self._m2 = self._m2 + other._m2 + delta**2 * self.count * other.count / total
+        self._histogram += other._histogram
+        self.count = total
+
+    @property
+    def resolution(self):
+        """Width of the bins from 1 upwards, relative to where they start."""
+        return self.edges[2] / self.edges[1] - 1
+
+    @property
+    def variance(self):
+        """Sample variance across replicates."""
+        return self._m2 / max(self.count - 1, 1)
+
+    def quantiles(self, quantiles=(0.05, 0.5, 0.95)):
+        """Approximate quantiles across replicates, as a (quantiles, compartments, ticks) array."""
+        cumulative = np.cumsum(self._histogram, axis=-1)
+        result = []
+        for q in quantiles:
+            target = q * self.count
+            # First bin reaching the target, interpolated linearly within the bin
+            bin = np.argmax(cumulative >= target, axis=-1)[..., None]
+            below = np.take_along_axis(cumulative, bin, axis=-1) - np.take_along_axis(
+                self._histogram, bin, axis=-1
+            )
+            inside = np.take_along_axis(self._histogram, bin, axis=-1)
+            fraction = np.divide(
+                target - below, inside, out=np.zeros(inside.shape), where=inside > 0
+            )
+            lower, width = self.edges[bin], np.diff(self.edges)[bin]
+            result.append((lower + fraction * width)[..., 0])
+        return np.array(result)
+
+
+def run_replicate(config, seed):
+    """
+    Runs one replicate on its own random stream.
+    Returns its compartment counts as a (compartments, ticks) array, one tick per day.
+    """
+    rng = np.random.default_rng(seed)
+    model, size, duration = config["model"], config["population_size"], config["duration"]
+
+    if config["engine"] == "agent":
+        sim = Simulation(size, config["params"], duration, config["dims"], model=model, rng=rng)
+        values, _ = sim.simulate()
+        series = np.array(values)
+        # Nothing changes after the epidemic dies out, hold the last counts
+        return np.pad(series, ((0, 0), (0, duration - series.shape[1])), mode="edge")
+
+    # Well-mixed engines start, like Epidemic, with one infectious individual
+    inits = [size - 1 if status == Status.SUSCEPTIBLE else 0 for status in COMPARTMENTS[model]]
+    inits[COMPARTMENTS[model].index(Status.INFECTIOUS)] = 1
+    steps = np.arange(1, duration + 1, dtype=float)
+    return ENGINES[config["engine"]](model, inits, config["params"], steps, rng=rng)[0]
+
+
+def run_batch(config, seeds):
+    """Runs a batch of replicates in one worker and returns only their summary."""
+    summary = StreamingSummary(
+        (len(COMPARTMENTS[config["model"]]), config["duration"]),
+        config["population_size"],
+        config["bins"],
+    )
+    for seed in seeds:
+        summary.add(run_replicate(config, seed)[None])
+    return summary
+
+
+def run_ensemble(
+    model,
+    population_size,
+    params,
+    duration,
+    replicates,
+    seed=None,
+    engine="agent",
+    dims=(40, 120),
+    bins=256,
+    max_workers=None,
+    batch_size=None,
+):
+    """
+    Runs Monte Carlo replicates across worker processes and summarises them per tick.
+    Every replicate gets an independent random stream spawned from seed, so results do
+    not depend on the number of workers or how replicates are batched. engine is "agent"
+    (the spatial Simulation, headless in a dims world), "gillespie" or "tau_leap".
+    Quantiles come from bins log-spaced up to population_size: with the default 256 bins
+    and a million individuals they are exact to within 5.6% of their value (the
+    summary's resolution), more bins make them finer.
+    Returns a StreamingSummary over the compartments of the model and duration ticks.
+    """
+    config = {
+        "model": model,
+        "population_size": population_size,
+        "params": params,
+        "duration": duration,
+        "engine": engine,
+        "dims": dims,
+        "bins": bins,
+    }
+    seeds = np.random.SeedSequence(seed).spawn(replicates)
+
+    summary = StreamingSummary((len(COMPARTMENTS[model]), duration), population_size, bins)
+    for batch in map_chunks(partial(run_batch, config), seeds, max_workers, batch_size):
+        summary.merge(batch)
+
+    return summary
@@ -0,0 +1,185 @@
+import numpy as np
+from scipy import sparse
+from core import Status, STATUS_CODES
+from simulation import Simulation
+
+SUSCEPTIBLE = STATUS_CODES[Status.SUSCEPTIBLE]
+INFECTIOUS = STATUS_CODES[Status.INFECTIOUS]
+
+# Ticks per day, the time scale of the agent simulation's infectious_ticks
+TICKS_PER_DAY = 5
+
+
+class ContactNetwork:
+    """
+    Contacts between individuals, as named layers (households, schools, workplaces, ...)
+    of undirected weighted edges. The layers are combined, every layer scaled by its
+    weight, into one symmetric CSR adjacency matrix, rebuilt only when layers or weights
+    change. Setting a layer's weight to 0 removes its contacts, e.g. to close schools.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.layers = {}
+        self.weights = {}
+        self._adjacency = None
+
+    def add_layer(self, name, rows, cols, weight=1.0, values=None):
+        """
+        Adds a layer of contacts between rows[k] and cols[k], each of strength values[k]
+        (1 by default). Self contacts are dropped and repeated contacts add up.
+        """
+        rows, cols = np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)
+        values = np.ones(len(rows)) if values is None else np.asarray(values, dtype=float)
+        distinct = rows != cols
+        rows, cols, values = rows[distinct], cols[distinct], values[distinct]
+
+        # Both directions of every contact, so the matrix is symmetric
+        layer = sparse.csr_matrix(
+            (
+                np.concatenate([values, values]),
+                (np.concatenate([rows, cols]), np.concatenate([cols, rows])),
+            ),
+            shape=(self.size, self.size),
+        )
+        self.layers[name] = layer
+        self.weights[name] = weight
+        self._adjacency = None
+
+    def set_weight(self, name, weight):
+        """Changes the weight of a layer."""
+        if name not in self.layers:
+            raise KeyError(name)
+        self.weights[name] = weight
+        self._adjacency = None
+
+    @property
+    def adjacency(self):
+        """The weighted sum of the layers, as a CSR matrix."""
+        if self._adjacency is None:
+            adjacency = sparse.csr_matrix((self.size, self.size))
+            for name, layer in self.layers.items():
+                if self.weights[name]:
+                    adjacency = adjacency + self.weights[name] * layer
+            self._adjacency = adjacency.tocsr()
+        return self._adjacency
+
+    @property
+    def edges(self):
+        """Number of distinct undirected contacts across the weighted layers."""
+        return self.adjacency.nnz // 2
+
+
+def clique_edges(size, clique_size, rng=None):
+    """
+    Contacts of individuals split at random into groups of clique_size (the last one
+    smaller), everyone in touch with everyone else in their group, e.g. households.
+    Returns the rows and cols of the contacts, for ContactNetwork.add_layer.
+    """
+    rng = np.random.default_rng(rng)
+    members = rng.permutation(size)
+    clique = np.arange(size) // clique_size
+    rows, cols = [], []
+    for offset in range(1, clique_size):
+        same = np.flatnonzero(clique[:-offset] == clique[offset:])
+        rows.append(members[same])
+        cols.append(members[same + offset])
+    if not rows:
+        return np.empty(0, np.intp), np.empty(0, np.intp)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def random_edges(size, mean_degree, rng=None):
+    """
+    Contacts between uniformly random pairs of individuals, mean_degree per individual
+    on average, e.g. casual contacts at work or in the community.
+    Returns the rows and cols of the contacts, for ContactNetwork.add_layer.
+    """
+    rng = np.random.default_rng(rng)
+    count = int(size * mean_degree / 2)
+    return rng.integers(size, size=count), rng.integers(size, size=count)
+
+
+class NetworkSimulation(Simulation):
+    """
+    Simulates an Epidemic spreading over a ContactNetwork instead of by proximity.
+    Every tick, the infection pressure on each individual is the summed weight of their
+    contacts with infectious individuals, one sparse matrix-vector product, and each
+    susceptible individual under pressure w is infected with probability
+    1 - exp(-beta * w / TICKS_PER_DAY). Courses of infection, recovery and death follow
+    the agent simulation's timed transitions.
+    """
+
+    def __init__(self, network, params, duration, model="SIR", history=False, rng=None):
+        self.network = network
+        super().__init__(
+            network.size, params, duration, None, model=model, history=history, rng=rng
+        )
+
+    def initialize_space(self, dims, index):
+        """Contacts are not spatial, there is no world and no spatial index"""
+        self.height = self.width = None
+        self.index = None
+
+    def initialize_simulator(self):
+        """Schedules the initially infected individuals' recovery"""
+        self.schedule_removal(
+            np.flatnonzero(self.population.status == INFECTIOUS), self.infectious_ticks(6)
+        )
+
+    def movement(self):
+        """Individuals keep their contacts, nobody moves."""
+
+    def spread_infection(self):
+        """Infection spreads along the contacts of infectious individuals"""
+        pop = self.population
+        if not pop.counts[INFECTIOUS]:
+            return
+
+        adjacency = self.network.adjacency
+        pressure = adjacency @ (pop.status == INFECTIOUS).astype(float)
+        at_risk = np.flatnonzero((pressure > 0) & (pop.status == SUSCEPTIBLE))
+        chance = -np.expm1(-self.params["beta"] * pressure[at_risk] / TICKS_PER_DAY)
+        infected = at_risk[self.rng.random(len(at_risk)) < chance]
+
+        if self.profile is not None:
+            self.profile.count(pair_checks=adjacency.nnz, infections=len(infected))
+        self.infect(infected)
+
+    def _metadata(self):
+        """Metadata describing the run, for sinks"""
+        return {
+            "params": self.params,
+            "seed": self.seed,
+            "layers": {
+                name: int(layer.nnz // 2) for name, layer in self.network.layers.items()
+            },
+            "weights": self.network.weights,
+        }
+
+    def _space_state(self):
+        """The contact network: every layer's CSR arrays, and the layers' names and weights."""
+        arrays = {}
+        for position, layer in enumerate(self.network.layers.values()):
+            for name in ("data", "indices", "indptr"):
+                arrays[f"layer{position}_{name}"] = getattr(layer, name)
+        meta = {
+            "size": self.network.size,
+            "layers": list(self.network.layers),
+            "weights": self.network.weights,
+        }
+        return arrays, meta
+
+    def _restore_space(self, state, meta):
+        """Rebuilds the contact network from _space_state() output."""
+        self.initialize_space(None, None)
+        network = ContactNetwork(meta["size"])
+        for position, name in enumerate(meta["layers"]):
+            data, indices, indptr = (
+                np.array(state[f"layer{position}_{key}"]) for key in ("data", "indices", "indptr")
+            )
+            network.layers[name] = sparse.csr_matrix(
+                (data, indices, indptr), shape=(network.size, network.size)
+            )
+            network.weights[name] = meta["weights"][name]
+        self.network = network
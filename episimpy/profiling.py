@@ -0,0 +1,80 @@
+import json
+
+# Phases of a simulation tick, in the order Simulation.run calls them
+PHASES = ("movement", "spread_infection", "recover_individual")
+
+
+class SimulationStats:
+    """
+    Instrumentation of a simulation: wall-clock time spent in every phase, pair distance
+    checks, infections and agent-ticks, in total and for the last tick.
+    """
+
+    def __init__(self):
+        self.ticks = 0
+        self.agent_ticks = 0
+        self.pair_checks = 0
+        self.infections = 0
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.last_tick = self._empty_tick()
+
+    @staticmethod
+    def _empty_tick():
+        return {"pair_checks": 0, "infections": 0, "seconds": dict.fromkeys(PHASES, 0.0)}
+
+    def begin_tick(self):
+        """Starts counting a new tick."""
+        self.last_tick = self._empty_tick()
+
+    def add_phase(self, phase, seconds):
+        """Adds the time spent in a phase of the current tick."""
+        self.phase_seconds[phase] += seconds
+        self.last_tick["seconds"][phase] = seconds
+
+    def count(self, pair_checks=0, infections=0):
+        """Adds pair distance checks and infections to the current tick."""
+        self.pair_checks += pair_checks
+        self.infections += infections
+        self.last_tick["pair_checks"] += pair_checks
+        self.last_tick["infections"] += infections
+
+    def end_tick(self, agents):
+        """Finishes the current tick of a simulation of the given number of agents."""
+        self.ticks += 1
+        self.agent_ticks += agents
+
+    @property
+    def seconds(self):
+        """Total time spent simulating."""
+        return sum(self.phase_seconds.values())
+
+    @property
+    def agent_ticks_per_second(self):
+        return self.agent_ticks / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        """A one line summary, short enough for the curses status line."""
+        tick_ms = sum(self.last_tick["seconds"].values()) * 1000
+        return (
+            f"tick {tick_ms:.1f} ms | {self.agent_ticks_per_second:,.0f} agent-ticks/s | "
+            f"{self.last_tick['infections']} new infections"
+        )
+
+    def to_dict(self):
+        return {
+            "ticks": self.ticks,
+            "agent_ticks": self.agent_ticks,
+            "agent_ticks_per_second": self.agent_ticks_per_second,
+            "pair_checks": self.pair_checks,
+            "infections": self.infections,
+            "phase_seconds": dict(self.phase_seconds),
+            "last_tick": self.last_tick,
+        }
+
+    def to_json(self, path=None):
+        """The stats as JSON, also written to path when given."""
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
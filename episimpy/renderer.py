@@ -0,0 +1,79 @@
+import curses
+import numpy as np
+from core import Status, STATUSES, GROUPS
+
+# Glyphs of each status, for the normal and the real simulation types.
+# In the real simulation susceptible individuals show their age group instead.
+GLYPHS = {
+    "normal": {
+        Status.SUSCEPTIBLE: "🟦",
+        Status.EXPOSED: "🟨",
+        Status.INFECTIOUS: "🟥",
+        Status.RECOVERED: "🟩",
+        Status.DEAD: "⬛",
+    },
+    "real": {
+        Status.EXPOSED: "🤒",
+        Status.INFECTIOUS: "🤢",
+        Status.RECOVERED: "😷",
+        Status.DEAD: "💀",
+    },
+}
+
+# Glyphs are two columns wide, so the screen is split into cells of two columns
+CELL_WIDTH = 2
+EMPTY = -1
+
+
+class Renderer:
+    """
+    Draws the individuals of a simulation onto a curses window.
+    A frame buffer holds the glyph shown in every cell, so each frame only writes the
+    cells that changed since the previous one instead of repainting the screen.
+    """
+
+    def __init__(self, window, simtype="normal"):
+        self.window = window
+        self.rows, columns = window.getmaxyx()
+        self.cells = columns // CELL_WIDTH
+
+        # Glyph of every (status, age group) pair, looked up by status * len(GROUPS) + group
+        glyphs = GLYPHS[simtype]
+        self.glyphs = [
+            glyphs.get(status, group.value[1]) for status in STATUSES for group in GROUPS
+        ]
+        self.frame = np.full((self.rows, self.cells), EMPTY, dtype=np.int16)
+        self.status_line = None
+
+    def compose(self, population):
+        """Builds the frame buffer of the population's current state."""
+        frame = np.full_like(self.frame, EMPTY)
+        rows = population.y.astype(np.intp)
+        cells = population.x.astype(np.intp) // CELL_WIDTH
+        # The first row is kept for the status line
+        shown = (rows >= 1) & (rows < self.rows) & (cells >= 0) & (cells < self.cells)
+        codes = population.status[shown].astype(np.int16) * len(GROUPS) + population.group[shown]
+        frame[rows[shown], cells[shown]] = codes
+        return frame
+
+    def draw(self, population, status_line=""):
+        """Writes the cells that changed since the last frame, then the status line."""
+        frame = self.compose(population)
+
+        for row, cell in np.argwhere(frame != self.frame):
+            code = frame[row, cell]
+            glyph = " " * CELL_WIDTH if code == EMPTY else self.glyphs[code]
+            try:
+                self.window.addstr(row, cell * CELL_WIDTH, glyph)
+            except curses.error:  # Writing to the bottom right corner raises
+                pass
+        self.frame = frame
+
+        if status_line != self.status_line:
+            self.window.move(0, 0)
+            self.window.clrtoeol()
+            self.window.addstr(0, 0, status_line[: self.cells * CELL_WIDTH - 1])
+            self.status_line = status_line
+
+        self.window.noutrefresh()
+        curses.doupdate()
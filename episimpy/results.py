@@ -0,0 +1,131 @@
+import json, os
+import numpy as np
+from core import Status, COMPARTMENTS
+
+METADATA = "metadata.json"
+
+
+def _jsonable(value):
+    """Converts NumPy values in metadata to plain Python ones."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ResultWriter:
+    """
+    Streams the time series of a run to a directory, one chunk at a time.
+    Every compartment (and the time axis) is appended to its own flat binary file, so
+    readers can memory-map a single compartment. The run's metadata (model, params,
+    seed, solver statistics, ...) is kept in metadata.json, rewritten with the length
+    after every chunk, so what was streamed stays readable if the run dies midway.
+    With append, the series continue those already in the directory, e.g. from a
+    simulation restored from a snapshot.
+    """
+
+    def __init__(self, directory, model="SIR", metadata=None, dtype=np.float64, append=False):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.compartments = [status.name.lower() for status in COMPARTMENTS[model]]
+        self.metadata = {"model": model, **(metadata or {})}
+        self.length = 0
+
+        path = os.path.join(directory, METADATA)
+        if append and os.path.exists(path):
+            with open(path) as file:
+                previous = json.load(file)
+            if previous["compartments"] != self.compartments:
+                raise ValueError(f"{directory} holds {previous['model']} series, not {model}")
+            if np.dtype(previous["dtype"]) != self.dtype:
+                raise ValueError(f"{directory} holds {previous['dtype']} series")
+            self.metadata = {**previous, **self.metadata}
+            self.length = previous["length"]
+
+        os.makedirs(directory, exist_ok=True)
+        self._files = {
+            name: open(os.path.join(directory, f"{name}.bin"), "ab" if append else "wb")
+            for name in ["time", *self.compartments]
+        }
+        # Drop anything written after the last recorded chunk
+        self.truncate(self.length)
+
+    def write(self, time, values):
+        """Appends a chunk: its time steps and one series per compartment."""
+        time = np.asarray(time, dtype=self.dtype)
+        self._files["time"].write(time.tobytes())
+        for name, series in zip(self.compartments, values, strict=True):
+            self._files[name].write(np.asarray(series, dtype=self.dtype).tobytes())
+        self.length += len(time)
+        self.flush()
+
+    def truncate(self, length):
+        """Drops every time step after the first length ones."""
+        for file in self._files.values():
+            file.flush()
+            file.truncate(length * self.dtype.itemsize)
+        self.length = length
+        self.flush()
+
+    def flush(self):
+        """Flushes the series, then records their length in the metadata."""
+        for file in self._files.values():
+            file.flush()
+
+        metadata = {
+            **self.metadata,
+            "compartments": self.compartments,
+            "dtype": self.dtype.str,
+            "length": self.length,
+        }
+        # Replaced in one step, so readers never see a partial file
+        path = os.path.join(self.directory, METADATA)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(metadata, file, indent=2, default=_jsonable)
+        os.replace(f"{path}.tmp", path)
+
+    def close(self):
+        """Flushes the series and the metadata, and closes the files."""
+        self.flush()
+        for file in self._files.values():
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ResultReader:
+    """Reads a run written by ResultWriter, memory-mapping each series on demand."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, METADATA)) as file:
+            self.metadata = json.load(file)
+        self.dtype = np.dtype(self.metadata["dtype"])
+        self.compartments = self.metadata["compartments"]
+
+    def __len__(self):
+        return self.metadata["length"]
+
+    def __getitem__(self, name):
+        """A compartment (by name or Status) or "time", as a read-only memory map."""
+        if isinstance(name, Status):
+            name = name.name.lower()
+        if name != "time" and name not in self.compartments:
+            raise KeyError(name)
+        if not len(self):  # Empty files cannot be memory-mapped
+            return np.empty(0, dtype=self.dtype)
+        path = os.path.join(self.directory, f"{name}.bin")
+        return np.memmap(path, dtype=self.dtype, mode="r", shape=(len(self),))
+
+    @property
+    def time(self):
+        return self["time"]
+
+    def load(self):
+        """Loads every compartment, as a (compartments, T) array."""
+        return np.array([self[name] for name in self.compartments])
@@ -0,0 +1,58 @@
+import heapq
+from itertools import count
+import numpy as np
+
+
+class TimerWheel:
+    """
+    Schedules timed status transitions of individuals.
+    Transitions due within `slots` ticks sit in a ring of buckets, one per tick, so that
+    advancing only touches the transitions that are due. Transitions further ahead wait
+    in a heap keyed on their due tick until the wheel comes within reach of them.
+    """
+
+    def __init__(self, slots=256):
+        self.slots = slots
+        self.tick = 0
+        self._wheel = [[] for _ in range(slots)]
+        self._overflow = []
+        self._order = count()  # Tie breaker for transitions due on the same tick
+
+    def schedule(self, indices, delay, status):
+        """
+        Schedules individuals to move to status after delay ticks (at least one).
+        Returns the tick at which the transition fires.
+        """
+        indices = np.atleast_1d(indices)
+        due = self.tick + max(int(delay), 1)
+        if not indices.size:
+            return due
+
+        if due - self.tick < self.slots:
+            self._wheel[due % self.slots].append((indices, status))
+        else:
+            heapq.heappush(self._overflow, (due, next(self._order), indices, status))
+        return due
+
+    def advance(self):
+        """Moves on by one tick and returns the transitions due, as {status: indices}."""
+        self.tick += 1
+
+        # Bring transitions that came within reach onto the wheel
+        while self._overflow and self._overflow[0][0] - self.tick < self.slots:
+            due, _, indices, status = heapq.heappop(self._overflow)
+            self._wheel[due % self.slots].append((indices, status))
+
+        slot = self.tick % self.slots
+        bucket, self._wheel[slot] = self._wheel[slot], []
+
+        due = {}
+        for indices, status in bucket:
+            due.setdefault(status, []).append(indices)
+
+        return {status: np.concatenate(parts) for status, parts in due.items()}
+
+    def __len__(self):
+        """Number of individuals with a pending transition."""
+        pending = sum(len(indices) for bucket in self._wheel for indices, _ in bucket)
+        return pending + sum(len(entry[2]) for entry in self._overflow)
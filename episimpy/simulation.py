@@ -1,93 +1,167 @@
-from core import Epidemic, Status
-from random import uniform
-import math, time
-import curses
+from core import Epidemic, Population, Status, STATUSES, STATUS_CODES, GROUPS
+from core import COMPARTMENTS
+from cache import default_cache
+from spatial import INDEXES
+from scheduler import TimerWheel
+from profiling import SimulationStats, PHASES
+from results import _jsonable
+import numpy as np
+import json, time
+
+SUSCEPTIBLE = STATUS_CODES[Status.SUSCEPTIBLE]
+EXPOSED = STATUS_CODES[Status.EXPOSED]
+INFECTIOUS = STATUS_CODES[Status.INFECTIOUS]
+
+# Maximum speed of every age group, indexed like GROUPS
+MOBILITY = np.array([group.value[0] for group in GROUPS], dtype=float)
+
+
+def move(x, y, vx, vy, width, height):
+    """
+    Moves every individual by its velocity and bounces it off the walls, in place.
+    Velocities of individuals on or past a wall are pointed back into the world.
+    """
+    # Add the velocities to postitions to simulate movement
+    x += vx
+    y += vy
+
+    # Bouncing off walls/bounds of the simulation
+    for position, velocity, bound in ((x, vx, width), (y, vy, height)):
+        np.copysign(
+            velocity,
+            bound / 2 - position,
+            out=velocity,
+            where=(position <= 0) | (position >= bound),
+        )
+
 
 # Inherits the Epidemic class
 class Simulation(Epidemic):
     """Simulates an Epidemic"""
 
-    def __init__(self, population_size, params, duration, dims, simtype="normal", model="SIR"):
-        super().__init__(population_size, params, duration, model)
+    def __init__(
+        self,
+        population_size,
+        params,
+        duration,
+        dims,
+        simtype="normal",
+        model="SIR",
+        index="grid",
+        history=False,
+        rng=None,
+    ):
+        super().__init__(population_size, params, duration, model, rng=rng)
+        if history:  # Record the counts after every tick, for the epidemic curve
+            self.population.track_history()
 
         # Simulation specific parameters
-        self.positions = {}
-        self.velocities = {}
-        self.recovery_times = {}
-        self.height, self.width = dims
         self.simtype = simtype
+        self.initialize_space(dims, index)
+        # Timed status transitions, advanced once per tick
+        self.scheduler = TimerWheel()
+        self._reset_instrumentation()
         self.initialize_simulator()
 
+    def initialize_space(self, dims, index):
+        """Sets up the world individuals move in, and how their neighbours are found"""
+        self.height, self.width = dims
+        # Spatial index over susceptible individuals, for neighbour queries
+        self.index = INDEXES[index](self.width, self.height, self.get_infection_radius())
+
+    def _reset_instrumentation(self):
+        """Clears the throughput, profile and hooks of a new or restored simulation"""
+        self.throughput = None
+        # Per phase instrumentation, None unless profiling is enabled
+        self.profile = None
+        self.hooks = []
+
     def initialize_simulator(self):
         """Initializes the simulation with velocities and postitions"""
-        for i, individual in enumerate(self.population.individuals): # Fill the velocities and positions dictionaries
-            self.positions[individual] = (
-                uniform(0, self.width - 2),
-                uniform(0, self.height - 1),
-            )
-            factor = 10
-            velocity = (
-                (
-                    -individual.age_group.value[0] / factor,
-                    individual.age_group.value[0] / factor,
-                )
-                if self.simtype == "real" # If simtype is real, customize velocities based on age group
-                else (-1, 1)
-            )
-            self.velocities[individual] = (
-                uniform(*velocity),
-                uniform(*velocity),
-            )
-            if individual.status == Status.INFECTIOUS: # Set initialally infected individual's recovery time
-                self.recovery_times[individual] = int(1 / self.params["gamma"]) * 6
+        pop = self.population
+        n = len(pop)
+        pop.x[:] = self.rng.uniform(0, self.width - 2, n)
+        pop.y[:] = self.rng.uniform(0, self.height - 1, n)
+
+        # If simtype is real, customize velocities based on age group
+        factor = 10
+        speed = (
+            MOBILITY[pop.group] / factor if self.simtype == "real" else np.ones(n)
+        )
+        pop.vx[:] = self.rng.uniform(-speed, speed)
+        pop.vy[:] = self.rng.uniform(-speed, speed)
+
+        # Set initially infected individuals' recovery time
+        self.schedule_removal(
+            np.flatnonzero(pop.status == INFECTIOUS), self.infectious_ticks(6)
+        )
 
     def movement(self):
         """Handles movement of the individuals."""
-        for individual in self.population.individuals:
-            x, y = self.positions[individual]
-            vx, vy = self.velocities[individual]
+        pop = self.population
+        move(pop.x, pop.y, pop.vx, pop.vy, self.width, self.height)
 
-            # Add the velocities to postitions to simulate movement
-            new_x = x + vx
-            new_y = y + vy
+    def spread_infection(self):
+        """Infection spreads based on the infection radius"""
+        pop = self.population
 
-            # Bouncing off walls/bounds of the simulation
-            if new_x <= 0 or new_x >= self.width:
-                vx = -vx
-            if new_y <= 0 or new_y >= self.height:
-                vy = -vy
+        susceptible = np.flatnonzero(pop.status == SUSCEPTIBLE)
+        infectious = np.flatnonzero(pop.status == INFECTIOUS)
+        if not (susceptible.size and infectious.size):
+            return
 
-            # Update wrt to the bounce
-            self.velocities[individual] = (vx, vy)
-            self.positions[individual] = (new_x, new_y)
+        # Only susceptible individuals in nearby cells are tested
+        self.index.build(pop.x[susceptible], pop.y[susceptible])
+        _, nearby = self.index.query(
+            pop.x[infectious], pop.y[infectious], self.get_infection_radius()
+        )
+        infected = susceptible[np.unique(nearby)]
+        if self.profile is not None:
+            self.profile.count(pair_checks=self.index.checks, infections=len(infected))
+        self.infect(infected)
 
-    def spread_infection(self):
-        """Infection spreads based on the infection radius"""
-        # For the SIR model
-        for person in self.population.individuals:
-            if person.status == Status.INFECTIOUS:
-                for neighbour in self.population.individuals: # Infect if in the infection radius
-                    if (
-                        neighbour.status == Status.SUSCEPTIBLE
-                        and self._distance(person, neighbour)
-                        < self.get_infection_radius()
-                    ):
-                        neighbour.infect()
-                        self.recovery_times[neighbour] = (
-                            int(1 / self.params["gamma"]) * 5
-                        )
-
-        # For the SEIRD model
+    def infect(self, indices):
+        """Infects susceptible individuals and schedules the rest of their course"""
+        pop = self.population
+        if self.model == "SEIRD":  # Exposed first, infectious after the incubation period
+            pop.set_status(indices, Status.EXPOSED)
+            self.schedule(indices, int(1 / self.params["sigma"]) * 5, Status.INFECTIOUS)
+        else:
+            pop.set_status(indices, Status.INFECTIOUS)
+            self.schedule_removal(indices, self.infectious_ticks())
 
     def recover_individual(self):
-        """Recovers individual based on their recovery time"""
-        for individual, time in list(self.recovery_times.items()): # Count down recovery time for the infected people
-            time -= 1
-            if time <= 0:
-                individual.recover()
-                del self.recovery_times[individual]
-            else:
-                self.recovery_times[individual] = time
+        """Applies the timed transitions (infection, recovery, death) due this tick"""
+        pop = self.population
+        for status, indices in self.scheduler.advance().items():
+            pop.set_status(indices, status)
+            pop.transition_tick[indices] = -1
+            if status == Status.INFECTIOUS:  # End of incubation, schedule the outcome
+                self.schedule_removal(indices, self.infectious_ticks())
+
+    def schedule(self, indices, ticks, status):
+        """Schedules individuals to move to status after the given number of ticks"""
+        due = self.scheduler.schedule(indices, ticks, status)
+        self.population.transition_tick[indices] = due
+        self.population.next_status[indices] = STATUS_CODES[status]
+
+    def schedule_removal(self, indices, ticks):
+        """Schedules infectious individuals to recover, or to die under SEIRD"""
+        if self.model == "SEIRD":
+            # Deaths and recoveries compete, a death has probability mu / (gamma + mu)
+            gamma, mu = self.params["gamma"], self.params["mu"]
+            dies = self.rng.random(len(indices)) < mu / (gamma + mu)
+            self.schedule(indices[dies], ticks, Status.DEAD)
+            self.schedule(indices[~dies], ticks, Status.RECOVERED)
+        else:
+            self.schedule(indices, ticks, Status.RECOVERED)
+
+    def infectious_ticks(self, factor=5):
+        """Number of ticks an individual stays infectious"""
+        rate = self.params["gamma"]
+        if self.model == "SEIRD":
+            rate += self.params["mu"]
+        return int(1 / rate) * factor
 
     def get_infection_radius(self):
         """Determines infection radius based on beta, the infection rate"""
@@ -103,33 +177,216 @@ class Simulation(Epidemic):
         else:
             return 5
 
-    def _distance(self, i1, i2):
-        """Calculate the distance between two individuals."""
-        x1, y1 = self.positions[i1]
-        x2, y2 = self.positions[i2]
+    def enable_profiling(self, hook=None):
+        """
+        Starts timing every phase of a tick and counting pair checks and infections,
+        in a fresh SimulationStats kept in self.profile. hook, if given, is added to the
+        hooks called with the simulation after every tick.
+        """
+        self.profile = SimulationStats()
+        if hook is not None:
+            self.hooks.append(hook)
+        return self.profile
 
-        return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+    def disable_profiling(self):
+        """Stops profiling and removes the hooks. Returns the stats collected."""
+        profile, self.profile, self.hooks = self.profile, None, []
+        return profile
 
     def run(self):
         """Run the simulation loop"""
-        self.movement()
-        self.spread_infection()
-        self.recover_individual()
-        # self.display_stats()
+        profile = self.profile
+        if profile is None:
+            self.movement()
+            self.spread_infection()
+            self.recover_individual()
+        else:
+            profile.begin_tick()
+            for phase in PHASES:
+                start = time.perf_counter()
+                getattr(self, phase)()
+                profile.add_phase(phase, time.perf_counter() - start)
+            profile.end_tick(len(self.population))
+        self.population.record()
+        for hook in self.hooks:
+            hook(self)
+
+    def simulate(self, ticks=None, stop_when_extinct=True, sink=None, chunk=1024):
+        """
+        Runs the simulation headless, as fast as possible, for the given number of ticks
+        (duration by default), stopping early once nobody is exposed or infectious.
+        Returns the per tick compartment series, in the model's order, and the ticks.
+        With a sink (a ResultWriter), the series are also streamed to it every chunk ticks;
+        a sink appending to the output of an earlier run, e.g. one this simulation was
+        restored from a snapshot of, is cut or filled in to continue from the current tick.
+        The achieved throughput is kept in self.throughput.
+        """
+        ticks = self.duration if ticks is None else ticks
+        pop = self.population
+        if pop.history is None:
+            pop.track_history(max(ticks, 1))
+        first = written = len(pop.history)
+
+        if sink is not None:
+            sink.metadata.update(self._metadata())
+            if sink.length:  # Appending to earlier output, continue it from this tick
+                sink.truncate(min(sink.length, first))
+                written = sink.length
+
+        start = time.perf_counter()
+        for _ in range(ticks):
+            self.run()
+            extinct = stop_when_extinct and not (pop.counts[INFECTIOUS] or pop.counts[EXPOSED])
+            if sink is not None and len(pop.history) - written >= chunk:
+                written = self._write_history(sink, written)
+            if extinct:
+                break
+        elapsed = time.perf_counter() - start
+
+        history = pop.history[first:]
+        done = len(history)
+        self.throughput = {
+            "ticks": done,
+            "elapsed": elapsed,
+            "agent_ticks_per_second": done * len(pop) / elapsed if elapsed else 0.0,
+        }
+        if sink is not None:
+            self._write_history(sink, written)
+            sink.metadata["throughput"] = self.throughput
+
+        return list(self._series(history)), np.arange(first + 1, first + done + 1)
+
+    def _metadata(self):
+        """Metadata describing the run, for sinks"""
+        return {"params": self.params, "seed": self.seed, "dims": [self.height, self.width]}
+
+    def _series(self, history):
+        """Picks the model's compartments out of count history rows, one row per compartment."""
+        codes = [STATUS_CODES[status] for status in COMPARTMENTS[self.model]]
+        return history[:, codes].T
+
+    def _write_history(self, sink, start):
+        """Writes the count history from tick start onwards to sink. Returns where it stopped."""
+        history = self.population.history
+        sink.write(np.arange(start + 1, len(history) + 1), self._series(history[start:]))
+        return len(history)
+
+    def snapshot(self, path):
+        """
+        Writes the full simulation state, random generator included, to an .npz file.
+        The population is stored as flat arrays, uncompressed, so snapshots stay fast.
+        """
+        state, meta = self._state()
+        np.savez(path, meta=np.array(json.dumps(meta, default=_jsonable)), **state)
+
+    @classmethod
+    def restore(cls, path, rng=None):
+        """
+        Rebuilds a simulation from a snapshot. It continues exactly where the snapshot was
+        taken, or on the given random generator (or seed) instead.
+        """
+        with np.load(path) as snapshot:
+            meta = json.loads(str(snapshot["meta"]))
+            state = {name: snapshot[name] for name in snapshot.files if name != "meta"}
+        return cls._from_state(state, meta, rng)
+
+    def fork(self, rng=None):
+        """
+        Copies the simulation in memory, so branches (e.g. interventions changing params)
+        can continue from the same point without re-simulating it. The copy continues on
+        the same random stream unless given another generator (or seed).
+        """
+        state, meta = self._state()
+        return self._from_state(state, meta, rng)
+
+    def _state(self):
+        """The simulation state: flat arrays, and JSON-compatible metadata."""
+        meta = {
+            "size": self.population.size,
+            "params": self.params,
+            "duration": self.duration,
+            "model": self.model,
+            "solver": self.solver,
+            "seed": self.seed,
+            "simtype": self.simtype,
+            "tick": self.scheduler.tick,
+            "slots": self.scheduler.slots,
+            "rng": self.rng.bit_generator.state,
+        }
+        space, meta["space"] = self._space_state()
+        return {**self.population.state(), **space}, meta
+
+    def _space_state(self):
+        """The state of the world: flat arrays, and JSON-compatible metadata."""
+        index = next(name for name, index in INDEXES.items() if isinstance(self.index, index))
+        return {}, {"dims": [self.height, self.width], "index": index}
+
+    def _restore_space(self, state, meta):
+        """Rebuilds the world from _space_state() output."""
+        self.initialize_space(meta["dims"], meta["index"])
+
+    @classmethod
+    def _from_state(cls, state, meta, rng=None):
+        """Builds a simulation from _state() output, without re-initializing it."""
+        if rng is None:  # Resume the saved random stream
+            bit_generator = getattr(np.random, meta["rng"]["bit_generator"])()
+            bit_generator.state = meta["rng"]
+            rng = np.random.Generator(bit_generator)
+
+        sim = cls.__new__(cls)
+        sim.rng = np.random.default_rng(rng)
+        sim.seed = meta["seed"]
+        sim.population = Population.from_state(state, meta["size"], sim.rng)
+        sim.params = dict(meta["params"])
+        sim.duration = meta["duration"]
+        sim.model = meta["model"]
+        sim.solver = dict(meta["solver"])
+        sim.stats = None
+        sim.cache = default_cache
+        sim.simtype = meta["simtype"]
+        sim._restore_space(state, meta["space"])
+        sim._reset_instrumentation()
+
+        # Pending transitions are rebuilt from the population's arrays
+        sim.scheduler = TimerWheel(meta["slots"])
+        sim.scheduler.tick = meta["tick"]
+        pop = sim.population
+        pending = np.flatnonzero(pop.transition_tick >= 0)
+        keys = pop.transition_tick[pending] * len(STATUSES) + pop.next_status[pending]
+        order = np.argsort(keys, kind="stable")
+        groups, starts = np.unique(keys[order], return_index=True)
+        for key, indices in zip(groups, np.split(pending[order], starts[1:])):
+            due, code = divmod(int(key), len(STATUSES))
+            sim.scheduler.schedule(indices, due - sim.scheduler.tick, STATUSES[code])
+
+        return sim
 
     def display_stats(self):
         """Displays the stats for the infection"""
         s_count, i_count, r_count, _, _ = self.population.get_counts()
 
-        return (
+        stats = (
             f"Susceptible: {s_count} 😊 Infected: {i_count} 🤢  Recovered: {r_count} 😷"
             if self.simtype == "real"
             else f"Susceptible: {s_count} 🟦  Infected: {i_count} 🟥  Recovered: {r_count} 🟩"
         )
+        if self.profile is not None:
+            stats += f"  | {self.profile.summary()}"
+        return stats
 
 
-def animate(stdscr, size, params, duration, simtype):
-    """The main animation function that handles dynamic arguments given by the user"""
+def animate(
+    stdscr, size, params, duration, simtype, tick_rate=10, frame_rate=10, profile=None
+):
+    """
+    The main animation function that handles dynamic arguments given by the user.
+    The simulation advances tick_rate times a second and the screen is redrawn up to
+    frame_rate times a second; frames are dropped when drawing cannot keep up.
+    With a profile path, the simulation is profiled, its stats shown on the status line
+    and dumped to the path as JSON on quitting.
+    """
+    import curses
+    from renderer import Renderer
 
     curses.curs_set(0)  # Hide cursor
     stdscr.nodelay(True)  # Non-blocking input
@@ -141,43 +398,41 @@ def animate(stdscr, size, params, duration, simtype):
         dims=scrdims,
         simtype=simtype,
     )
+    if profile is not None:
+        sim.enable_profiling()
+    stdscr.clear()
+    renderer = Renderer(stdscr, simtype)
+
+    tick_interval, frame_interval = 1 / tick_rate, 1 / frame_rate
+    next_tick = next_frame = time.perf_counter()
 
     while True:
         key = stdscr.getch()
         if key == ord("q"):  # Quit when 'q' is pressed
             break
-        stdscr.clear()
-        sim.run()
-
-        # Display individuals
-        for individual, (x, y) in sim.positions.items():
-            emoji = (
-                (
-                    individual.age_group.value[1]
-                    if individual.status == Status.SUSCEPTIBLE
-                    else "🤢" if individual.status == Status.INFECTIOUS else "😷"
-                )
-                if simtype == "real"
-                else (
-                    "🟦"
-                    if individual.status == Status.SUSCEPTIBLE
-                    else "🟥" if individual.status == Status.INFECTIOUS else "🟩"
-                )
-            )
-            try:
-                stdscr.addstr(int(y), int(x), emoji)
-            except curses.error:
-                pass
-
-        stdscr.addstr(0, 0, sim.display_stats())
-        stdscr.refresh()
-        time.sleep(0.1)
-
-
-def run(n=100, p={"beta": 0.02, "gamma": 0.1}, t=100, simtype="normal"):
+
+        now = time.perf_counter()
+        if now >= next_tick:
+            sim.run()
+            next_tick = max(next_tick + tick_interval, now)
+        if now >= next_frame:
+            renderer.draw(sim.population, sim.display_stats())
+            next_frame = max(next_frame + frame_interval, now)
+
+        time.sleep(max(0.0, min(next_tick, next_frame) - time.perf_counter()))
+
+    if profile is not None:
+        sim.profile.to_json(profile)
+
+
+def run(n=100, p={"beta": 0.02, "gamma": 0.1}, t=100, simtype="normal", profile=None):
     """Runs the actual simulation with user defined parameters"""
+    import curses
+
     curses.wrapper(
-        lambda stdscr: animate(stdscr, size=n, params=p, duration=t, simtype=simtype)
+        lambda stdscr: animate(
+            stdscr, size=n, params=p, duration=t, simtype=simtype, profile=profile
+        )
     )
 
 
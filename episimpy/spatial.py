@@ -0,0 +1,108 @@
+from itertools import chain
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class GridIndex:
+    """
+    Uniform grid (cell list) over the simulation world.
+    Points are bucketed into square cells of side cell_size, so a radius query
+    only has to test the points in the cells that overlap the radius.
+    """
+
+    def __init__(self, width, height, cell_size):
+        self.cell_size = float(cell_size)
+        self.cols = int(np.ceil(width / self.cell_size)) + 1
+        self.rows = int(np.ceil(height / self.cell_size)) + 1
+        self._order = self._starts = None
+        self._x = self._y = None
+        self.checks = 0  # Pair distance checks made by the last query
+
+    def _cells(self, x, y):
+        """Column and row of the cell holding each point, clamped to the grid."""
+        cx = np.clip(np.floor(x / self.cell_size), 0, self.cols - 1).astype(np.intp)
+        cy = np.clip(np.floor(y / self.cell_size), 0, self.rows - 1).astype(np.intp)
+        return cx, cy
+
+    def build(self, x, y):
+        """(Re)builds the index over the given points."""
+        cx, cy = self._cells(x, y)
+        cells = cy * self.cols + cx
+        self._order = np.argsort(cells, kind="stable")
+        # Points of cell c are self._order[starts[c]:starts[c + 1]]
+        self._starts = np.searchsorted(
+            cells[self._order], np.arange(self.cols * self.rows + 1)
+        )
+        self._x, self._y = x, y
+
+    def query(self, px, py, radius):
+        """
+        Finds all (query point, indexed point) pairs closer than radius.
+        Returns two index arrays: into the query points and into the indexed points.
+        """
+        qx, qy = self._cells(px, py)
+        reach = int(np.ceil(radius / self.cell_size))
+        sources, candidates = [], []
+
+        for dy in range(-reach, reach + 1):
+            for dx in range(-reach, reach + 1):
+                nx, ny = qx + dx, qy + dy
+                valid = np.flatnonzero(
+                    (nx >= 0) & (nx < self.cols) & (ny >= 0) & (ny < self.rows)
+                )
+                cells = ny[valid] * self.cols + nx[valid]
+                start = self._starts[cells]
+                count = self._starts[cells + 1] - start
+                total = count.sum()
+                if not total:
+                    continue
+
+                # Expand every [start, start + count) range into its positions
+                offsets = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+                sources.append(np.repeat(valid, count))
+                candidates.append(self._order[np.repeat(start, count) + offsets])
+
+        if not sources:
+            self.checks = 0
+            return np.empty(0, np.intp), np.empty(0, np.intp)
+
+        sources = np.concatenate(sources)
+        candidates = np.concatenate(candidates)
+        self.checks = len(candidates)
+        near = (self._x[candidates] - px[sources]) ** 2 + (
+            self._y[candidates] - py[sources]
+        ) ** 2 < radius**2
+
+        return sources[near], candidates[near]
+
+
+class KDTreeIndex:
+    """KD-tree backed index, better suited to sparse or very uneven worlds."""
+
+    def __init__(self, width=None, height=None, cell_size=None):
+        self._tree = None
+        self.checks = 0  # Pairs found by the last query, the tree's own checks are hidden
+
+    def build(self, x, y):
+        """(Re)builds the index over the given points."""
+        self._tree = cKDTree(np.column_stack((x, y)))
+
+    def query(self, px, py, radius):
+        """
+        Finds all (query point, indexed point) pairs closer than radius.
+        Returns two index arrays: into the query points and into the indexed points.
+        """
+        # The tree includes points at exactly radius, the simulation does not
+        hits = self._tree.query_ball_point(
+            np.column_stack((px, py)), np.nextafter(radius, 0), return_sorted=False
+        )
+        counts = np.fromiter(map(len, hits), np.intp, len(hits))
+        sources = np.repeat(np.arange(len(hits)), counts)
+        candidates = np.fromiter(chain.from_iterable(hits), np.intp, counts.sum())
+        self.checks = len(candidates)
+
+        return sources, candidates
+
+
+# Available spatial index backends
+INDEXES = {"grid": GridIndex, "kdtree": KDTreeIndex}
@@ -0,0 +1,156 @@
+import numpy as np
+from core import Status, COMPARTMENTS
+
+# Reactions of each well-mixed model: the change every reaction makes to the compartments
+# and its propensity, the same flows as in SIR.sir_model and SEIRD.seird_model.
+# States are (compartments, replicates) arrays, propensities (reactions, replicates).
+REACTIONS = {
+    "SIR": (
+        np.array(
+            [
+                [-1, 1, 0],  # Infection
+                [0, -1, 1],  # Recovery
+            ]
+        ),
+        lambda x, p: np.array([p["beta"] * x[0] * x[1], p["gamma"] * x[1]]),
+    ),
+    "SEIRD": (
+        np.array(
+            [
+                [-1, 1, 0, 0, 0],  # Exposure
+                [0, -1, 1, 0, 0],  # Onset of infectiousness
+                [0, 0, -1, 1, 0],  # Recovery
+                [0, 0, -1, 0, 1],  # Death
+            ]
+        ),
+        lambda x, p: np.array(
+            [
+                p["beta"] * x[0] * x[2],
+                p["sigma"] * x[1],
+                p["gamma"] * x[2],
+                p["mu"] * x[2],
+            ]
+        ),
+    ),
+}
+
+
+def gillespie(model, inits, params, time_steps, replicates=1, rng=None):
+    """
+    Exact stochastic simulation (Gillespie's direct method) of the well-mixed model.
+    All replicates step together, drawing their waiting times and reactions in batches.
+    Returns the compartments sampled at time_steps as a (replicates, compartments, T) array.
+    """
+    return _simulate(model, inits, params, time_steps, replicates, rng, epsilon=None)
+
+
+def tau_leap(model, inits, params, time_steps, replicates=1, epsilon=0.03, rng=None):
+    """
+    Approximate stochastic simulation of the well-mixed model by adaptive tau-leaping.
+    Each leap fires Poisson numbers of every reaction, with the leap chosen so that no
+    propensity is expected to change by more than a fraction epsilon (Cao, Gillespie and
+    Petzold, 2006). Replicates expecting only a few events fall back to exact steps.
+    Returns the compartments sampled at time_steps as a (replicates, compartments, T) array.
+    """
+    return _simulate(model, inits, params, time_steps, replicates, rng, epsilon)
+
+
+def extinction_probability(trajectories, model):
+    """Fraction of replicates in which nobody is exposed or infectious at the end."""
+    compartments = COMPARTMENTS[model]
+    carriers = [
+        compartments.index(status)
+        for status in (Status.EXPOSED, Status.INFECTIOUS)
+        if status in compartments
+    ]
+    return float(np.mean(trajectories[:, carriers, -1].sum(axis=1) == 0))
+
+
+def quantile_bands(trajectories, quantiles=(0.05, 0.5, 0.95)):
+    """Quantiles across replicates, as a (quantiles, compartments, T) array."""
+    return np.quantile(trajectories, quantiles, axis=0)
+
+
+def _simulate(model, inits, params, time_steps, replicates, rng, epsilon):
+    """Runs the replicates in lockstep, exactly or by tau-leaping when epsilon is given."""
+    rng = np.random.default_rng(rng)
+    stoichiometry, propensities = REACTIONS[model]
+    time_steps = np.asarray(time_steps, dtype=float)
+
+    x = np.repeat(np.asarray(inits, dtype=np.int64)[:, None], replicates, axis=1)
+    t = np.full(replicates, time_steps[0])
+    recorded = np.zeros(replicates, dtype=np.intp)  # Time steps recorded so far
+    out = np.empty((replicates, len(x), len(time_steps)), dtype=np.int64)
+
+    active = np.arange(replicates)
+    while active.size:
+        state = x[:, active]
+        rates = propensities(state.astype(float), params)
+        total = rates.sum(axis=0)
+
+        if epsilon is None:
+            step, change = _exact_step(rates, total, stoichiometry, rng)
+        else:
+            step, change = _leap(state, rates, total, stoichiometry, epsilon, rng)
+
+        # The current state holds until the step ends
+        _record(out, state, active, recorded, time_steps, t[active] + step)
+        x[:, active] += change
+        t[active] += step
+        active = active[recorded[active] < len(time_steps)]
+
+    return out
+
+
+def _exact_step(rates, total, stoichiometry, rng):
+    """One reaction per replicate. Replicates with nothing left to happen wait forever."""
+    with np.errstate(divide="ignore"):
+        step = rng.exponential(size=total.shape) / total
+    threshold = rng.random(total.shape) * total
+    reaction = (np.cumsum(rates, axis=0) < threshold).sum(axis=0)
+    reaction = np.minimum(reaction, len(stoichiometry) - 1)
+
+    change = stoichiometry[reaction].T * (total > 0)
+    return step, change
+
+
+def _leap(state, rates, total, stoichiometry, epsilon, rng):
+    """One tau-leap per replicate, or an exact step when a leap would be too short."""
+    # Expected drift and variance of every compartment per unit time
+    drift = stoichiometry.T @ rates
+    variance = (stoichiometry.T**2) @ rates
+    bound = np.maximum(epsilon * state / 2, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tau = np.minimum(bound / np.abs(drift), bound**2 / variance)
+    tau = np.nan_to_num(tau, nan=np.inf).min(axis=0)
+
+    step, change = _exact_step(rates, total, stoichiometry, rng)
+
+    # Leaping only pays off when several events are expected per leap
+    with np.errstate(invalid="ignore"):
+        leaping = np.flatnonzero(tau * total >= 10)
+    while leaping.size:
+        fired = rng.poisson(rates[:, leaping] * tau[leaping])
+        leap_change = stoichiometry.T @ fired
+        valid = (state[:, leaping] + leap_change >= 0).all(axis=0)
+
+        accepted = leaping[valid]
+        step[accepted] = tau[accepted]
+        change[:, accepted] = leap_change[:, valid]
+
+        # Leaps that emptied a compartment below zero are retried with half the length
+        leaping = leaping[~valid]
+        tau[leaping] /= 2
+
+    return step, change
+
+
+def _record(out, state, active, recorded, time_steps, until):
+    """Records the state of the active replicates at every time step before until."""
+    end = np.searchsorted(time_steps, until, side="left")
+    counts = end - recorded[active]
+    if counts.sum():
+        local = np.repeat(np.arange(len(active)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        out[active[local], :, recorded[active][local] + offsets] = state[:, local].T
+    recorded[active] = end
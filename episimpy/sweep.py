@@ -0,0 +1,156 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import islice, product
+import math, os, time
+import numpy as np
+from core import Epidemic, Status, COMPARTMENTS
+from simulation import Simulation
+from results import ResultWriter
+
+# Values used for the keys a task does not specify
+DEFAULTS = {
+    "model": "SIR",
+    "population_size": 500,
+    "beta": 0.001,
+    "gamma": 0.1,
+    "sigma": 0.2,
+    "mu": 0.01,
+    "duration": 100,
+    "seed": None,  # Tasks with a seed run the stochastic agent simulation, headless
+}
+
+# Epidemic parameters used by each model
+PARAMS = {"SIR": ("beta", "gamma"), "SEIRD": ("beta", "gamma", "sigma", "mu")}
+
+# World size (height, width) of the stochastic agent simulation
+DIMS = (40, 120)
+
+
+def expand_grid(grid):
+    """
+    Expands a parameter grid into a list of tasks.
+    A grid is either a dict whose list/range/array values are swept over (every
+    combination becomes a task) or an explicit list of task dicts.
+    """
+    if not isinstance(grid, dict):
+        return [dict(task) for task in grid]
+
+    values = [
+        value if isinstance(value, (list, range, np.ndarray)) else [value]
+        for value in grid.values()
+    ]
+    return [dict(zip(grid, combination)) for combination in product(*values)]
+
+
+def run_task(task, directory=None):
+    """
+    Runs a single task, without plotting. Returns the task with its results added.
+    With a directory, the series are written to a run directory of their own in it
+    (see ResultWriter) and only its path is returned.
+    """
+    start = time.perf_counter()
+    task = {**DEFAULTS, **task}
+    model = task["model"]
+    params = {name: task[name] for name in PARAMS[model]}
+
+    sink = None
+    if directory is not None:
+        sink = ResultWriter(
+            os.path.join(directory, f"task-{task.get('task', 0):06d}"), model, dict(task)
+        )
+
+    if task["seed"] is None:  # Deterministic, solve the ODE model
+        epidemic = Epidemic(task["population_size"], params, task["duration"], model)
+        values, time_steps = epidemic.solve(sink)
+        series = np.array(values)
+    else:  # Stochastic, run the agent simulation for up to duration ticks
+        sim = Simulation(
+            task["population_size"], params, task["duration"], DIMS, model=model, rng=task["seed"]
+        )
+        values, time_steps = sim.simulate(sink=sink)
+        series = np.array(values)
+
+    infected = series[COMPARTMENTS[model].index(Status.INFECTIOUS)]
+    peak = int(np.argmax(infected))
+
+    result = {
+        **task,
+        "peak_infected": float(infected[peak]),
+        "peak_time": float(time_steps[peak]),
+    }
+    if sink is None:
+        result.update(time=time_steps, series=series)
+    else:
+        sink.close()
+        result["path"] = sink.directory
+
+    result.update(elapsed=time.perf_counter() - start, worker=os.getpid())
+    return result
+
+
+def map_chunks(function, items, max_workers=None, chunksize=None, chunks_per_worker=4):
+    """
+    Hands out items in chunks to function across a pool of worker processes and yields
+    its results, one per chunk, in completion order. By default every worker gets about
+    chunks_per_worker chunks: a few balance uneven items, one keeps work together.
+    At most two chunks per worker are in flight, and every result is dropped once
+    yielded, so only a bounded number of results are ever held at once.
+    function must be picklable, e.g. a module level function or a partial of one.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(items) / (workers * chunks_per_worker)))
+    chunks = (items[i : i + chunksize] for i in range(0, len(items), chunksize))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        while True:
+            for chunk in islice(chunks, 2 * workers - len(pending)):
+                pending.add(executor.submit(function, chunk))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            while done:
+                yield done.pop().result()
+
+
+def run_chunk(tasks, directory=None):
+    """Runs a chunk of tasks in one worker."""
+    return [run_task(task, directory) for task in tasks]
+
+
+def to_columns(results):
+    """
+    Turns a list of result dicts into a dict of columns.
+    Columns of numbers become arrays, anything else (series, None) stays a list.
+    """
+    keys = list(dict.fromkeys(key for result in results for key in result))
+    columns = {}
+    for key in keys:
+        values = [result.get(key) for result in results]
+        numeric = all(
+            isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+            for value in values
+        )
+        columns[key] = np.array(values) if numeric else values
+    return columns
+
+
+def sweep(grid, max_workers=None, chunksize=None, directory=None):
+    """
+    Runs every task of a parameter grid across a pool of worker processes.
+    Tasks are handed out in chunks and results are collected in completion order,
+    with each task's wall-clock time in the "elapsed" column.
+    With a directory, every task's series are streamed to disk instead of returned.
+    Returns the results as a dict of columns.
+    """
+    tasks = expand_grid(grid)
+    for number, task in enumerate(tasks):
+        task["task"] = number
+
+    results = []
+    run = partial(run_chunk, directory=directory)
+    for chunk in map_chunks(run, tasks, max_workers, chunksize):
+        results.extend(chunk)
+
+    return to_columns(results)
@@ -0,0 +1,98 @@
+from calibration import sensitivities, fit, calibrate, INITIAL
+import numpy as np
+import pytest
+
+time_points = np.arange(0, 101.0)
+truth = {"beta": 3e-5, "sigma": 0.3, "gamma": 0.1, "mu": 0.01, INITIAL: 5.0}
+population = 10_000
+
+
+def series(x):
+    """Infectious, recovered and dead counts of a SEIRD solution."""
+    return {"infectious": x[2], "recovered": x[3], "dead": x[4]}
+
+
+def daily(x):
+    """Daily new cases, recoveries and deaths of a SEIRD solution."""
+    S, E, I, R, D = np.diff(x)
+    return {"cases": -(S + E), "recoveries": R, "deaths": D}
+
+
+def test_sensitivities_match_finite_differences():
+    x, s = sensitivities("SEIRD", population, truth, time_points, rtol=1e-10, atol=1e-10)
+    assert x.shape == (5, 1, 101) and s.shape == (5, 5, 1, 101)
+
+    for column, name in enumerate(["beta", "sigma", "gamma", "mu", INITIAL]):
+        eps = 1e-6
+        up = {**truth, name: truth[name] * np.exp(eps)}
+        down = {**truth, name: truth[name] * np.exp(-eps)}
+        x_up, _ = sensitivities("SEIRD", population, up, time_points, rtol=1e-10, atol=1e-10)
+        x_down, _ = sensitivities("SEIRD", population, down, time_points, rtol=1e-10, atol=1e-10)
+        expected = (x_up - x_down) / (2 * eps)
+        np.testing.assert_allclose(s[:, column], expected, rtol=1e-4, atol=1e-3)
+
+
+@pytest.mark.parametrize("loss, observe", [("least_squares", series), ("poisson", daily)])
+def test_fit_recovers_the_parameters(loss, observe):
+    x, _ = sensitivities("SEIRD", population, truth, time_points, rtol=1e-8, atol=1e-8)
+    observed = observe(x[:, 0])
+    observed[list(observed)[-1]][::7] = np.nan  # Missing days are skipped
+    start = {"beta": 5e-5, "sigma": 0.5, "gamma": 0.2, "mu": 0.005, INITIAL: 1.0}
+
+    (result,) = fit("SEIRD", time_points, observed, population, start, loss=loss)
+    assert result["success"]
+    for name, value in result["params"].items():
+        assert value == pytest.approx(truth[name], rel=1e-2)
+    assert result["inits"][2] == pytest.approx(truth[INITIAL], rel=1e-2)
+    assert sum(result["inits"]) == pytest.approx(population)
+
+
+def test_sir_cases_are_new_infections():
+    sir = {"beta": 3e-5, "gamma": 0.1, INITIAL: 5.0}
+    x, _ = sensitivities("SIR", population, sir, time_points, rtol=1e-8, atol=1e-8)
+    cases = -np.diff(x[0, 0])
+    start = {"beta": 5e-5, "gamma": 0.2, INITIAL: 1.0}
+    (result,) = fit("SIR", time_points, {"cases": cases}, population, start, loss="poisson")
+    assert result["params"]["beta"] == pytest.approx(sir["beta"], rel=1e-2)
+    assert result["params"]["gamma"] == pytest.approx(sir["gamma"], rel=1e-2)
+
+    with pytest.raises(ValueError):
+        fit("SIR", time_points, {"deaths": cases}, population, start)
+    # Levels are not Poisson counts
+    with pytest.raises(ValueError):
+        fit("SIR", time_points, {"infectious": x[1, 0]}, population, start, loss="poisson")
+
+
+def test_fit_holds_values_not_fitted():
+    x, _ = sensitivities("SEIRD", population, truth, time_points)
+    start = {**truth, "beta": 5e-5, "gamma": 0.2}
+    (result,) = fit("SEIRD", time_points, series(x[:, 0]), population, start, ["beta", "gamma"])
+    assert result["params"]["sigma"] == truth["sigma"]
+    assert result["params"]["beta"] == pytest.approx(truth["beta"], rel=1e-2)
+
+
+def test_calibrate_many_regions():
+    rng = np.random.default_rng(1)
+    populations = [5_000, 20_000, 50_000]
+    gammas = [0.08, 0.1, 0.15]
+    regions = [{**truth, "beta": 0.4 / n, "gamma": g} for n, g in zip(populations, gammas)]
+    observations = []
+    for n, values in zip(populations, regions):
+        x, _ = sensitivities("SEIRD", n, values, time_points)
+        observations.append({key: rng.poisson(v) for key, v in daily(x[:, 0]).items()})
+
+    best = calibrate(
+        "SEIRD", time_points, observations, populations, starts=3, loss="poisson", seed=0,
+        max_workers=2,
+    )
+    assert len(best) == 3
+    for result, values in zip(best, regions):
+        assert result["params"]["beta"] == pytest.approx(values["beta"], rel=0.1)
+        assert result["params"]["gamma"] == pytest.approx(values["gamma"], rel=0.1)
+
+    # The same seed draws the same start points; batches share solver steps, so up to tolerance
+    again = calibrate(
+        "SEIRD", time_points, observations, populations, starts=3, loss="poisson", seed=0,
+        max_workers=1,
+    )
+    assert [r["loss"] for r in again] == pytest.approx([r["loss"] for r in best], rel=1e-4)
@@ -1,6 +1,63 @@
-from core import Population
+from core import Population, Individual, Status, Groups, age_group_codes
+import numpy as np
 import pytest
 
+
 def test_Population():
-    assert 
+    population = Population(1000)
+    assert len(population) == len(population.individuals) == len(population.status)
+    assert population.get_counts() == (len(population), 0, 0, 0, 0)
+
+
+@pytest.mark.parametrize("size", [0, 1, 7, 999, 12345])
+def test_population_accounts_for_every_individual(size):
+    population = Population(size, rng=0)
+    assert len(population) == size
+    counts = np.bincount(population.group, minlength=5)
+    # Rounding never moves a group more than one individual off its share
+    expected = np.array([7.5, 19, 17.5, 45, 11]) / 100 * size
+    assert np.all(np.abs(counts - expected) < 1)
+    np.testing.assert_array_equal(population.group, age_group_codes(population.age))
+
+
+def test_Individual_view():
+    population = Population(100)
+    person = population.individuals[0]
+    assert isinstance(person, Individual)
+    assert person.age_group == Groups.INFANTS
+
+    person.infect()
+    assert population.individuals[0].status == Status.INFECTIOUS
+    assert population.get_counts()[1] == 1
+
+    person.die()
+    assert population.get_counts()[4] == 1
+    assert person == population.individuals[0]
+    assert person != population.individuals[1]
+
+
+@pytest.mark.parametrize(
+    "age, group",
+    [(1, Groups.INFANTS), (5, Groups.INFANTS), (6, Groups.TEENS), (24, Groups.ADULTS),
+     (25, Groups.MIDDLE), (64, Groups.MIDDLE), (65, Groups.OLD)],
+)
+def test_age_groups(age, group):
+    population = Population(100)
+    population.age[0] = age
+    population.group[:] = age_group_codes(population.age)
+    assert population.individuals[0].age_group == group
+
+
+def test_counts_and_history():
+    population = Population(200)
+    population.track_history(capacity=2)
+    for tick in range(5):
+        population.set_status([tick * 2, tick * 2 + 1], Status.INFECTIOUS)
+        population.record()
+    population.individuals[0].recover()
 
+    s_count, i_count, r_count, _, _ = population.get_counts()
+    assert (i_count, r_count) == (9, 1)
+    assert s_count == len(population) - 10
+    assert population.history.shape == (5, 5)
+    assert population.history[:, 2].tolist() == [2, 4, 6, 8, 10]
@@ -0,0 +1,90 @@
+from metapopulation import Metapopulation
+from models import SIR
+from scipy import sparse
+import numpy as np
+import pytest
+
+time_points = np.arange(0, 100.1, 1.0)
+params = {"beta": 0.001, "gamma": 0.1, "sigma": 0.2, "mu": 0.01}
+
+
+def chain(patches, rate):
+    """Patches in a line, each exchanging individuals with its neighbours."""
+    mobility = sparse.diags([rate, rate], [-1, 1], shape=(patches, patches))
+    return Metapopulation("SEIRD", mobility)
+
+
+def test_uncoupled_patches_follow_the_well_mixed_model():
+    meta = Metapopulation("SIR", sparse.csr_matrix((3, 3)))
+    inits = np.array([[999, 499, 200], [1, 1, 0], [0, 0, 0]])
+    sir = {"beta": 0.002, "gamma": 0.1}
+    values, t = meta.solve(inits, sir, time_points, rtol=1e-8, atol=1e-8)
+    for patch in range(3):
+        *expected, _ = SIR.solve_sir(inits[:, patch], sir, time_points, rtol=1e-8, atol=1e-8)
+        np.testing.assert_allclose(values[:, patch], expected, atol=1e-3)
+
+
+def test_analytical_jacobian_matches_finite_differences():
+    meta = chain(6, 0.05)
+    rng = np.random.default_rng(0)
+    y = rng.uniform(0, 100, 30)
+    jacobian = meta.jacobian(0, y, params).toarray()
+    eps = 1e-6
+    for column in range(30):
+        step = np.zeros(30)
+        step[column] = eps
+        up, down = (meta.model_function(0, y + sign * step, params) for sign in (1, -1))
+        np.testing.assert_allclose(jacobian[:, column], (up - down) / (2 * eps), atol=1e-6)
+
+
+@pytest.mark.parametrize("method", ["BDF", "Radau"])
+def test_implicit_solvers_use_the_sparse_jacobian(method):
+    meta = chain(50, 0.05)
+    inits = np.zeros((5, 50))
+    inits[0], inits[2, 0] = 1000, 1
+    expected, _ = meta.solve(inits, params, time_points, rtol=1e-6)
+    values, t, stats = meta.solve(
+        inits, params, time_points, method=method, rtol=1e-6, full_output=True
+    )
+
+    assert stats["success"] and stats["njev"] > 0 and stats["nlu"] > 0
+    np.testing.assert_allclose(values, expected, atol=2.0)
+    # Movement conserves the population, and the epidemic travels down the chain
+    np.testing.assert_allclose(values.sum(axis=(0, 1)), inits.sum(), rtol=1e-6)
+    assert values[2, 10].max() > 1
+
+
+def test_stochastic_movement_follows_the_rates():
+    meta = Metapopulation("SIR", sparse.csr_matrix([[0.0, 0, 0], [3, 0, 0], [1, 0, 0]]))
+    x = np.array([[100_000, 0, 0], [0, 0, 0], [0, 0, 0]])
+    meta._move(x, 10, np.random.default_rng(0))
+    assert x.sum() == 100_000
+    np.testing.assert_allclose(x[0, 1:] / 100_000, [0.75, 0.25], atol=0.01)
+
+
+def test_stochastic_counterpart_matches_the_ode_mean():
+    meta = chain(5, 0.1)
+    inits = np.zeros((5, 5), dtype=np.int64)
+    inits[0], inits[2, 0] = 10_000, 100
+    seird = {**params, "beta": 1e-4}
+    expected, _ = meta.solve(inits, seird, time_points)
+    runs = np.array([meta.simulate(inits, seird, time_points, rng=seed) for seed in range(20)])
+
+    assert (runs.sum(axis=(1, 2)) == inits.sum()).all()
+    # Averaged over runs, every compartment of every patch ends up near the ODE solution
+    np.testing.assert_allclose(runs.mean(axis=0)[:, :, -1], expected[:, :, -1], rtol=0.1, atol=50)
+
+
+def test_krylov_solves_scale_to_random_mobility_graphs():
+    # Sparse LU fill-in makes a random graph of this size impractical to factorize
+    patches = 2000
+    rng = np.random.default_rng(0)
+    sources, targets = rng.integers(patches, size=(2, 4 * patches))
+    mobility = sparse.csr_matrix((np.full(4 * patches, 0.01), (targets, sources)))
+    meta = Metapopulation("SEIRD", mobility)
+    inits = np.zeros((5, patches))
+    inits[0], inits[2, :5] = 1000, 1
+
+    expected, _ = meta.solve(inits, params, time_points, rtol=1e-6)
+    values, _ = meta.solve(inits, params, time_points, method="BDF", rtol=1e-6)
+    np.testing.assert_allclose(values, expected, atol=20.0)
@@ -0,0 +1,169 @@
+from models import SIR, SEIRD, AgeSIR, AgeSEIRD, IMPLICIT_SOLVERS
+from core import Population, COMPARTMENTS, STATUS_CODES
+from cache import SolutionCache
+from stochastic import gillespie, tau_leap, extinction_probability, quantile_bands
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import numpy as np
+
+time_points = np.arange(0, 100.1, 0.1)
+
+
+def test_sir_ensemble_matches_single_solves():
+    betas = np.array([0.0005, 0.001, 0.002])
+    inits = np.array([[499, 1, 0], [999, 1, 0], [299, 1, 0]])
+    solutions, t = SIR.solve_sir_ensemble(inits, {"beta": betas, "gamma": 0.1}, time_points)
+    assert solutions.shape == (3, 3, len(time_points))
+
+    for k, (beta, init) in enumerate(zip(betas, inits)):
+        *single, _ = SIR.solve_sir(init, {"beta": beta, "gamma": 0.1}, time_points)
+        np.testing.assert_allclose(solutions[k], single, rtol=1e-2, atol=1.0)
+
+
+def test_seird_ensemble_conserves_population():
+    inits = np.tile([499, 0, 1, 0, 0], (4, 1))
+    params = {"beta": 0.001, "gamma": 0.1, "sigma": [0.1, 0.2, 0.3, 0.4], "mu": 0.01}
+    solutions, t = SEIRD.solve_seird_ensemble(inits, params, time_points)
+    np.testing.assert_allclose(solutions.sum(axis=1), 500, rtol=1e-6)
+
+
+def numerical_jacobian(model, x, params, eps=1e-6):
+    x = np.asarray(x, dtype=float)
+    columns = []
+    for j in range(len(x)):
+        step = np.zeros_like(x)
+        step[j] = eps
+        columns.append(
+            (np.array(model(0, x + step, params)) - np.array(model(0, x - step, params)))
+            / (2 * eps)
+        )
+    return np.column_stack(columns)
+
+
+def test_jacobians_match_finite_differences():
+    params = {"beta": 0.002, "gamma": 0.1, "sigma": 0.2, "mu": 0.01}
+    np.testing.assert_allclose(
+        SIR.jacobian(0, [400, 50, 50], params),
+        numerical_jacobian(SIR.sir_model, [400, 50, 50], params),
+        atol=1e-6,
+    )
+    np.testing.assert_allclose(
+        SEIRD.jacobian(0, [400, 20, 50, 25, 5], params),
+        numerical_jacobian(SEIRD.seird_model, [400, 20, 50, 25, 5], params),
+        atol=1e-6,
+    )
+
+
+def test_age_structured_jacobians_match_finite_differences():
+    rng = np.random.default_rng(0)
+    contacts = rng.uniform(0.5, 2, (5, 5))
+    params = {
+        "beta": 0.002, "gamma": 0.1, "sigma": 0.2, "mu": rng.uniform(0, 0.05, 5), "contacts": contacts
+    }
+    for model, compartments in ((AgeSIR, 3), (AgeSEIRD, 5)):
+        model_function = model.age_sir_model if model is AgeSIR else model.age_seird_model
+        x = rng.uniform(0, 100, compartments * 5)
+        np.testing.assert_allclose(
+            model.jacobian(0, x, params), numerical_jacobian(model_function, x, params), atol=1e-6
+        )
+
+
+@pytest.mark.parametrize("method", ["RK45", "Radau"])
+def test_uniform_mixing_reduces_to_the_unstratified_models(method):
+    population = Population(1000, rng=1)
+    population.individuals[0].infect()
+    counts = population.group_counts()
+    params = {"beta": 0.0005, "gamma": 0.1, "sigma": 0.2, "mu": 0.01, "contacts": np.ones((5, 5))}
+
+    inits = counts[[STATUS_CODES[status] for status in COMPARTMENTS["SIR"]]]
+    *groups, t = AgeSIR.solve_age_sir(inits, params, time_points, method=method, rtol=1e-6)
+    *total, _ = SIR.solve_sir(inits.sum(axis=1), params, time_points, method=method, rtol=1e-6)
+    np.testing.assert_allclose(np.sum(groups, axis=1), total, atol=0.5)
+
+    inits = counts[[STATUS_CODES[status] for status in COMPARTMENTS["SEIRD"]]]
+    *groups, t = AgeSEIRD.solve_age_seird(inits, params, time_points, method=method, rtol=1e-6)
+    *total, _ = SEIRD.solve_seird(inits.sum(axis=1), params, time_points, method=method, rtol=1e-6)
+    np.testing.assert_allclose(np.sum(groups, axis=1), total, atol=0.5)
+
+
+@pytest.mark.parametrize("method", IMPLICIT_SOLVERS)
+def test_implicit_solvers_use_jacobian(method):
+    params = {"beta": 0.002, "gamma": 0.1}
+    *explicit, _ = SIR.solve_sir([999, 1, 0], params, time_points, rtol=1e-6)
+    S, I, R, t, stats = SIR.solve_sir(
+        [999, 1, 0], params, time_points, method=method, rtol=1e-6, full_output=True
+    )
+    assert stats["method"] == method and stats["success"]
+    assert stats["nfev"] > 0
+    if method != "LSODA":  # LSODA only switches to its stiff method when needed
+        assert stats["njev"] > 0
+    np.testing.assert_allclose([S, I, R], explicit, atol=1.0)
+
+
+def test_solution_cache_memory_and_disk(tmp_path):
+    params = {"beta": 0.001, "gamma": 0.1}
+    cache = SolutionCache(maxsize=1, directory=tmp_path)
+    S, I, R, t = cache.solve("SIR", [499, 1, 0], params, time_points)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    cached = cache.solve("SIR", [499, 1, 0], params, time_points)
+    assert cache.hits == 1
+    np.testing.assert_array_equal(cached[1], I)
+
+    # Evicted from memory by another solution, then served from disk
+    cache.solve("SIR", [499, 1, 0], {"beta": 0.002, "gamma": 0.1}, time_points)
+    *_, stats = cache.solve("SIR", [499, 1, 0], params, time_points, full_output=True)
+    assert cache.hits == 2 and stats["method"] == "RK45" and stats["cached"]
+
+    # Different solver options are different solutions
+    cache.solve("SIR", [499, 1, 0], params, time_points, method="LSODA")
+    assert cache.misses == 3
+
+
+def test_solution_cache_bounds_disk_size(tmp_path):
+    cache = SolutionCache(directory=tmp_path, max_bytes=1)
+    *_, stats = cache.solve(
+        "SIR", [499, 1, 0], {"beta": 0.001, "gamma": 0.1}, time_points, full_output=True
+    )
+    assert list(tmp_path.iterdir()) == [] and not stats["cached"]
+
+
+def solve_through_shared_cache(directory, seed):
+    """Solves a few overlapping problems through a small cache shared on disk."""
+    cache = SolutionCache(maxsize=1, directory=directory, max_bytes=20_000)
+    rng = np.random.default_rng(seed)
+    for beta in rng.choice([0.001, 0.0012, 0.0014, 0.0016, 0.0018], size=60):
+        cache.solve("SIR", [499, 1, 0], {"beta": beta, "gamma": 0.1}, time_points)
+    return cache.hits + cache.misses
+
+
+def test_solution_cache_shared_between_processes(tmp_path):
+    # Processes evict files the others are about to read, which must count as misses
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        calls = executor.map(solve_through_shared_cache, [tmp_path] * 8, range(8))
+        assert list(calls) == [60] * 8
+
+
+@pytest.mark.parametrize("method", [gillespie, tau_leap])
+def test_stochastic_engines_follow_the_ode_mean(method):
+    n = 2000
+    params = {"beta": 0.3 / n, "gamma": 0.1}
+    steps = np.arange(0, 61.0)
+    trajectories = method("SIR", [n - 20, 20, 0], params, steps, replicates=100, rng=1)
+
+    assert trajectories.shape == (100, 3, len(steps))
+    assert np.all(trajectories.sum(axis=1) == n)
+    assert np.all(trajectories >= 0)
+
+    S, I, R, _ = SIR.solve_sir([n - 20, 20, 0], params, steps)
+    np.testing.assert_allclose(trajectories[:, 1, -1].mean(), I[-1], rtol=0.2)
+
+
+def test_tau_leap_handles_large_seird_populations():
+    n = 10**8
+    params = {"beta": 0.5 / n, "gamma": 0.1, "sigma": 0.2, "mu": 0.01}
+    steps = np.arange(0, 101.0)
+    trajectories = tau_leap("SEIRD", [n - 1000, 0, 1000, 0, 0], params, steps, 10, rng=2)
+    assert np.all(trajectories.sum(axis=1) == n)
+    assert extinction_probability(trajectories, "SEIRD") == 0.0
+    assert quantile_bands(trajectories).shape == (3, 5, len(steps))
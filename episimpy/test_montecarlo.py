@@ -0,0 +1,92 @@
+from montecarlo import StreamingSummary, run_batch, run_ensemble, run_replicate
+from sweep import map_chunks
+from functools import partial
+import gc
+import numpy as np
+import pytest
+
+
+def test_streaming_summary_matches_batch_statistics():
+    rng = np.random.default_rng(0)
+    trajectories = rng.integers(0, 1000, size=(500, 3, 20))
+
+    summary = StreamingSummary((3, 20), upper=1000, bins=1000)
+    other = StreamingSummary((3, 20), upper=1000, bins=1000)
+    for batch in np.array_split(trajectories[:300], 7):
+        summary.add(batch)
+    other.add(trajectories[300:])
+    summary.merge(other)
+
+    assert summary.count == 500
+    np.testing.assert_allclose(summary.mean, trajectories.mean(axis=0))
+    np.testing.assert_allclose(summary.variance, trajectories.var(axis=0, ddof=1))
+    np.testing.assert_allclose(
+        summary.quantiles((0.1, 0.5, 0.9)),
+        np.quantile(trajectories, (0.1, 0.5, 0.9), axis=0, method="inverted_cdf"),
+        rtol=summary.resolution,  # One bin
+        atol=1,
+    )
+
+
+def test_quantiles_resolve_small_counts_in_large_populations():
+    # An early or small outbreak in a population of a million
+    rng = np.random.default_rng(1)
+    trajectories = rng.poisson(np.linspace(0.5, 40, 10), size=(2000, 1, 10))
+    summary = StreamingSummary((1, 10), upper=10**6)
+    summary.add(trajectories)
+
+    expected = np.quantile(trajectories, (0.05, 0.5, 0.95), axis=0, method="inverted_cdf")
+    np.testing.assert_allclose(summary.quantiles(), expected, rtol=summary.resolution, atol=1)
+    assert summary.resolution < 0.06
+
+
+@pytest.mark.parametrize("engine", ["agent", "tau_leap"])
+def test_ensemble_is_reproducible_across_worker_counts(engine):
+    kwargs = dict(
+        model="SIR",
+        population_size=200,
+        params={"beta": 0.02 if engine == "agent" else 0.002, "gamma": 0.1},
+        duration=30,
+        replicates=8,
+        seed=42,
+        engine=engine,
+    )
+    one = run_ensemble(**kwargs, max_workers=1, batch_size=8)
+    many = run_ensemble(**kwargs, max_workers=3, batch_size=2)
+
+    assert one.count == many.count == 8
+    np.testing.assert_allclose(one.mean, many.mean)
+    np.testing.assert_array_equal(one.quantiles(), many.quantiles())
+
+
+def test_replicate_streams_are_independent():
+    config = {
+        "model": "SIR",
+        "population_size": 500,
+        "params": {"beta": 0.001, "gamma": 0.1},
+        "duration": 50,
+        "engine": "gillespie",
+    }
+    first, second = np.random.SeedSequence(1).spawn(2)
+    assert not np.array_equal(run_replicate(config, first), run_replicate(config, second))
+    np.testing.assert_array_equal(run_replicate(config, first), run_replicate(config, first))
+
+
+def test_batch_summaries_are_released_as_they_are_merged():
+    config = {
+        "model": "SIR",
+        "population_size": 200,
+        "params": {"beta": 0.002, "gamma": 0.1},
+        "duration": 30,
+        "engine": "tau_leap",
+        "bins": 64,
+    }
+    seeds = np.random.SeedSequence(0).spawn(40)
+    alive = []
+    for summary in map_chunks(partial(run_batch, config), seeds, max_workers=2, chunksize=1):
+        del summary
+        gc.collect()
+        alive.append(sum(isinstance(obj, StreamingSummary) for obj in gc.get_objects()))
+    assert len(alive) == 40
+    # Only the batches in flight are held, never all of them
+    assert max(alive) <= 4
@@ -0,0 +1,81 @@
+from core import Status, STATUS_CODES
+from network import ContactNetwork, NetworkSimulation, clique_edges, random_edges
+import numpy as np
+
+INFECTIOUS = STATUS_CODES[Status.INFECTIOUS]
+
+
+def ring(size):
+    network = ContactNetwork(size)
+    nodes = np.arange(size)
+    network.add_layer("ring", nodes, (nodes + 1) % size)
+    return network
+
+
+def test_layers_combine_into_a_symmetric_weighted_adjacency():
+    network = ContactNetwork(50)
+    network.add_layer("household", *clique_edges(50, 5, rng=0))
+    network.add_layer("work", *random_edges(50, 4, rng=1), weight=0.5)
+
+    adjacency = network.adjacency
+    assert (adjacency != adjacency.T).nnz == 0
+    assert adjacency.diagonal().sum() == 0
+    # Every household of five is a clique
+    assert network.layers["household"].nnz == 10 * 5 * 4
+
+    network.set_weight("work", 0)
+    assert (network.adjacency != network.layers["household"]).nnz == 0
+
+
+def test_infection_only_travels_along_contacts():
+    sim = NetworkSimulation(ring(100), {"beta": 1e3, "gamma": 0.01}, 100, rng=0)
+    seed = int(np.flatnonzero(sim.population.status == INFECTIOUS)[0])
+
+    for _ in range(10):
+        sim.run()
+    infectious = np.flatnonzero(sim.population.status == INFECTIOUS)
+    distance = np.minimum((infectious - seed) % 100, (seed - infectious) % 100)
+    # Certain transmission reaches exactly one more neighbour on each side per tick
+    np.testing.assert_array_equal(np.sort(distance), np.sort([0, *range(1, 11), *range(1, 11)]))
+
+
+def test_closed_layers_stop_transmission():
+    network = ring(100)
+    network.set_weight("ring", 0)
+    sim = NetworkSimulation(network, {"beta": 1e3, "gamma": 0.01}, 100, rng=0)
+    for _ in range(10):
+        sim.run()
+    assert sim.population.counts[INFECTIOUS] == 1
+
+
+def test_seird_courses_follow_the_agent_simulation():
+    network = ContactNetwork(2000)
+    network.add_layer("household", *clique_edges(2000, 4, rng=0))
+    network.add_layer("community", *random_edges(2000, 10, rng=1), weight=0.2)
+    params = {"beta": 2.0, "gamma": 0.2, "sigma": 0.5, "mu": 0.05}
+    sim = NetworkSimulation(network, params, 200, model="SEIRD", rng=3)
+    sim.enable_profiling()
+
+    (S, E, I, R, D), ticks = sim.simulate()
+    np.testing.assert_array_equal(S + E + I + R + D, 2000)
+    assert E[-1] == I[-1] == 0 and R[-1] > 100 and D[-1] > 0
+    assert sim.profile.infections == 2000 - S[-1] - 1
+
+
+def test_forks_and_snapshots_carry_the_network(tmp_path):
+    network = ContactNetwork(500)
+    network.add_layer("household", *clique_edges(500, 4, rng=0))
+    network.add_layer("school", *random_edges(500, 6, rng=1))
+    sim = NetworkSimulation(network, {"beta": 1.0, "gamma": 0.1}, 100, history=True, rng=2)
+    sim.simulate(ticks=10, stop_when_extinct=False)
+    sim.snapshot(tmp_path / "checkpoint.npz")
+
+    # Closing schools in a fork leaves the original network untouched
+    closed = sim.fork()
+    closed.network.set_weight("school", 0)
+    assert sim.network.weights["school"] == 1
+
+    expected, _ = sim.simulate(ticks=30, stop_when_extinct=False)
+    restored = NetworkSimulation.restore(tmp_path / "checkpoint.npz")
+    assert (restored.network.adjacency != network.adjacency).nnz == 0
+    np.testing.assert_array_equal(restored.simulate(ticks=30, stop_when_extinct=False)[0], expected)
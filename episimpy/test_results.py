@@ -0,0 +1,72 @@
+from core import Epidemic, Status
+from results import ResultWriter, ResultReader
+from simulation import Simulation
+from sweep import sweep
+import numpy as np
+
+
+def test_epidemic_run_is_streamed_to_disk(tmp_path):
+    epidemic = Epidemic(500, {"beta": 0.001, "gamma": 0.1}, 50, rng=3, cache=None)
+    with ResultWriter(tmp_path / "run") as sink:
+        (S, I, R), time_steps = epidemic.solve(sink)
+
+    reader = ResultReader(tmp_path / "run")
+    assert reader.metadata["model"] == "SIR" and reader.metadata["seed"] == 3
+    assert reader.metadata["solver"]["nfev"] > 0
+    assert isinstance(reader[Status.INFECTIOUS], np.memmap)
+    np.testing.assert_array_equal(reader["infectious"], I)
+    np.testing.assert_array_equal(reader.time, time_steps)
+
+
+def test_headless_simulation_streams_in_chunks(tmp_path):
+    sim = Simulation(300, {"beta": 0.02, "gamma": 0.1}, 40, (30, 30), rng=1)
+    with ResultWriter(tmp_path / "agents") as sink:
+        values, ticks = sim.simulate(stop_when_extinct=False, sink=sink, chunk=7)
+
+    reader = ResultReader(tmp_path / "agents")
+    assert len(reader) == 40 and reader.metadata["dims"] == [30, 30]
+    np.testing.assert_array_equal(reader.load(), values)
+    np.testing.assert_array_equal(reader.time, ticks)
+
+
+def test_streamed_chunks_are_readable_before_closing(tmp_path):
+    sink = ResultWriter(tmp_path / "run", "SIR", {"seed": 1})
+    assert len(ResultReader(tmp_path / "run")) == 0
+    sink.write([1, 2], [[9, 8], [1, 2], [0, 0]])
+    # A run dying here leaves what it streamed readable
+    reader = ResultReader(tmp_path / "run")
+    assert len(reader) == 2 and reader.metadata["seed"] == 1
+    np.testing.assert_array_equal(reader["susceptible"], [9, 8])
+    sink.close()
+
+
+def test_restored_simulation_appends_to_its_output(tmp_path):
+    params = {"beta": 0.02, "gamma": 0.1}
+    expected, _ = Simulation(300, params, 40, (30, 30), rng=4).simulate(stop_when_extinct=False)
+
+    sim = Simulation(300, params, 40, (30, 30), rng=4, history=True)
+    sink = ResultWriter(tmp_path / "run")
+    sim.simulate(ticks=15, stop_when_extinct=False, sink=sink, chunk=4)
+    sim.snapshot(tmp_path / "checkpoint.npz")
+    # The run streams past the snapshot, then dies without closing its sink
+    sim.simulate(ticks=10, stop_when_extinct=False, sink=sink, chunk=4)
+
+    restored = Simulation.restore(tmp_path / "checkpoint.npz")
+    with ResultWriter(tmp_path / "run", append=True) as sink:
+        restored.simulate(ticks=25, stop_when_extinct=False, sink=sink, chunk=4)
+
+    reader = ResultReader(tmp_path / "run")
+    np.testing.assert_array_equal(reader.time, np.arange(1, 41))
+    np.testing.assert_array_equal(reader.load(), expected)
+
+
+def test_sweep_writes_one_run_per_task(tmp_path):
+    results = sweep(
+        {"beta": [0.001, 0.002], "seed": [None, 5], "duration": 20},
+        max_workers=2,
+        directory=tmp_path,
+    )
+    assert "series" not in results
+    for path, seed in zip(results["path"], results["seed"]):
+        reader = ResultReader(path)
+        assert reader.metadata["seed"] == seed and len(reader) > 0
@@ -0,0 +1,237 @@
+from core import Status, STATUS_CODES
+from simulation import Simulation, MOBILITY
+from spatial import INDEXES
+from scheduler import TimerWheel
+import renderer
+import numpy as np
+import json
+import pytest
+
+
+def make_simulation(n=200, dims=(40, 120), params={"beta": 0.02, "gamma": 0.1}, **kwargs):
+    return Simulation(
+        population_size=n,
+        params=params,
+        duration=100,
+        dims=dims,
+        **kwargs,
+    )
+
+
+def test_movement_bounces_off_walls():
+    sim = make_simulation()
+    pop = sim.population
+    pop.x[0], pop.vx[0] = sim.width - 0.5, 1.0
+    sim.movement()
+    assert pop.vx[0] == -1.0
+
+
+def test_spread_and_recover():
+    sim = make_simulation()
+    pop = sim.population
+    pop.x[:] = 10.0
+    pop.y[:] = 10.0
+    sim.spread_infection()
+    s_count, i_count, r_count, _, _ = pop.get_counts()
+    assert s_count == 0 and i_count == len(pop)
+
+    for _ in range(int(1 / sim.params["gamma"]) * 6):
+        sim.recover_individual()
+    assert pop.get_counts()[2] == len(pop)
+    assert np.all(pop.status == STATUS_CODES[Status.RECOVERED])
+
+
+@pytest.mark.parametrize("backend", sorted(INDEXES))
+def test_spatial_index_matches_brute_force(backend):
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(0, 100, 2000), rng.uniform(0, 50, 2000)
+    px, py = rng.uniform(-1, 101, 50), rng.uniform(-1, 51, 50)
+    radius = 3
+
+    index = INDEXES[backend](100, 50, radius)
+    index.build(x, y)
+    sources, candidates = index.query(px, py, radius)
+
+    near = (x[None, :] - px[:, None]) ** 2 + (y[None, :] - py[:, None]) ** 2 < radius**2
+    expected = set(zip(*np.nonzero(near)))
+    assert set(zip(sources.tolist(), candidates.tolist())) == expected
+
+
+def test_movement_keeps_individuals_in_bounds():
+    sim = make_simulation(n=1000, dims=(20, 30))
+    for _ in range(500):
+        sim.movement()
+    pop = sim.population
+    # An individual can overshoot a wall by at most one step
+    assert np.all((pop.x > -1) & (pop.x < sim.width + 1))
+    assert np.all((pop.y > -1) & (pop.y < sim.height + 1))
+
+
+def test_real_velocities_follow_age_group_mobility():
+    sim = make_simulation(n=1000, simtype="real")
+    pop = sim.population
+    speed = MOBILITY[pop.group] / 10
+    assert np.all(np.abs(pop.vx) <= speed) and np.all(np.abs(pop.vy) <= speed)
+    # Infants do not move
+    assert np.all(pop.vx[pop.group == 0] == 0)
+
+
+def test_timer_wheel_fires_on_due_tick():
+    wheel = TimerWheel(slots=4)
+    wheel.schedule([1, 2], 3, Status.RECOVERED)
+    wheel.schedule([3], 10, Status.DEAD)  # Beyond the wheel, waits in the heap
+    assert len(wheel) == 3
+
+    fired = {}
+    for _ in range(10):
+        for status, indices in wheel.advance().items():
+            fired[wheel.tick, status] = indices.tolist()
+    assert fired == {(3, Status.RECOVERED): [1, 2], (10, Status.DEAD): [3]}
+    assert len(wheel) == 0
+
+
+def test_seird_agents_pass_through_every_stage():
+    sim = make_simulation(
+        n=500, model="SEIRD", params={"beta": 0.02, "gamma": 0.1, "sigma": 0.5, "mu": 0.1}
+    )
+    pop = sim.population
+    pop.x[:] = 10.0
+    pop.y[:] = 10.0
+    sim.spread_infection()
+    s_count, _, _, e_count, _ = pop.get_counts()
+    assert s_count == 0 and e_count == len(pop) - 1
+
+    for _ in range(100):
+        sim.recover_individual()
+    s_count, i_count, r_count, e_count, d_count = pop.get_counts()
+    assert i_count == e_count == 0
+    assert r_count + d_count == len(pop) and d_count > 0
+    assert np.all(pop.transition_tick == -1)
+
+
+def test_simulate_headless_until_extinction():
+    sim = make_simulation(n=300, dims=(30, 30))
+    values, ticks = sim.simulate(ticks=1000)
+    S, I, R = values
+
+    assert len(S) == len(ticks) == sim.throughput["ticks"] < 1000
+    assert I[-1] == 0 and S[-1] + R[-1] == len(sim.population)
+    assert sim.throughput["agent_ticks_per_second"] > 0
+
+    # Continuing picks up where the previous run stopped
+    more, more_ticks = sim.simulate(ticks=5, stop_when_extinct=False)
+    assert more_ticks.tolist() == list(range(ticks[-1] + 1, ticks[-1] + 6))
+
+
+class FakeWindow:
+    def __init__(self, rows, columns):
+        self.size = (rows, columns)
+        self.writes = []
+
+    def getmaxyx(self):
+        return self.size
+
+    def addstr(self, row, column, text):
+        self.writes.append((row, column, text))
+
+    def move(self, row, column):
+        pass
+
+    def clrtoeol(self):
+        pass
+
+    def noutrefresh(self):
+        pass
+
+
+def test_renderer_only_writes_changed_cells(monkeypatch):
+    monkeypatch.setattr(renderer.curses, "doupdate", lambda: None)
+    sim = make_simulation(n=100, dims=(20, 40))
+    window = FakeWindow(20, 40)
+    screen = renderer.Renderer(window)
+
+    screen.draw(sim.population, "stats")
+    first = len(window.writes)
+    assert 0 < first <= len(sim.population) + 1
+
+    window.writes.clear()
+    screen.draw(sim.population, "stats")
+    assert window.writes == []  # Nothing moved
+
+    pop = sim.population
+    last = np.flatnonzero(pop.status == STATUS_CODES[Status.SUSCEPTIBLE])[-1]
+    pop.x[last], pop.y[last] = 3.0, 5.0
+    window.writes.clear()
+    screen.draw(pop, "stats")
+    assert len(window.writes) <= 2  # At most the cell it left and the one it entered
+    assert screen.glyphs[screen.frame[5, 1]] == "🟦"
+
+
+def test_snapshot_restore_continues_identically(tmp_path):
+    params = {"beta": 0.02, "gamma": 0.1, "sigma": 0.3, "mu": 0.05}
+    sim = make_simulation(n=400, model="SEIRD", params=params, rng=7, history=True)
+    sim.simulate(ticks=15, stop_when_extinct=False)
+    sim.snapshot(tmp_path / "checkpoint.npz")
+
+    expected, _ = sim.simulate(ticks=40, stop_when_extinct=False)
+    restored = Simulation.restore(tmp_path / "checkpoint.npz")
+    assert len(restored.population.history) == 15
+    resumed, ticks = restored.simulate(ticks=40, stop_when_extinct=False)
+
+    np.testing.assert_array_equal(resumed, expected)
+    assert ticks[0] == 16
+    assert restored.population.get_counts() == sim.population.get_counts()
+
+
+def test_snapshot_accepts_numpy_scalars(tmp_path):
+    # As passed through from the arrays of a sweep grid
+    params = {"beta": np.float64(0.02), "gamma": np.float64(0.1)}
+    sim = Simulation(np.int64(200), params, np.int64(50), (30, 30), rng=np.int64(3))
+    sim.simulate(ticks=5, stop_when_extinct=False)
+    sim.snapshot(tmp_path / "checkpoint.npz")
+
+    restored = Simulation.restore(tmp_path / "checkpoint.npz")
+    assert restored.seed == 3 and restored.params == params
+    np.testing.assert_array_equal(
+        restored.simulate(ticks=10, stop_when_extinct=False)[0],
+        sim.simulate(ticks=10, stop_when_extinct=False)[0],
+    )
+
+
+def test_fork_branches_are_independent():
+    params = {"beta": 0.02, "gamma": 0.1, "sigma": 0.3, "mu": 0.05}
+    sim = make_simulation(n=300, model="SEIRD", params=params, rng=3)
+    sim.simulate(ticks=10, stop_when_extinct=False)
+
+    same = sim.fork()
+    other = sim.fork(rng=99)
+    lockdown = sim.fork()
+    lockdown.population.vx[:] = 0
+    assert np.any(sim.population.vx != 0)
+
+    baseline, _ = sim.simulate(ticks=60, stop_when_extinct=False)
+    np.testing.assert_array_equal(same.simulate(ticks=60, stop_when_extinct=False)[0], baseline)
+    # Another random stream decides other deaths
+    other.simulate(ticks=60, stop_when_extinct=False)
+    assert not np.array_equal(other.population.status, sim.population.status)
+
+
+def test_profiling_counts_phases_and_does_not_change_the_run(tmp_path):
+    baseline, _ = make_simulation(n=300, rng=5).simulate(ticks=30, stop_when_extinct=False)
+
+    sim = make_simulation(n=300, rng=5)
+    seen = []
+    stats = sim.enable_profiling(hook=lambda s: seen.append(s.profile.last_tick["infections"]))
+    values, _ = sim.simulate(ticks=30, stop_when_extinct=False)
+
+    np.testing.assert_array_equal(values, baseline)
+    assert stats.ticks == len(seen) == 30
+    assert stats.agent_ticks == 30 * len(sim.population)
+    assert stats.infections == sum(seen) == sim.population.counts[1:].sum() - 1
+    assert stats.pair_checks >= stats.infections
+    assert all(stats.phase_seconds[phase] > 0 for phase in stats.phase_seconds)
+    assert "agent-ticks/s" in sim.display_stats()
+
+    stats.to_json(tmp_path / "profile.json")
+    assert json.loads((tmp_path / "profile.json").read_text())["ticks"] == 30
+    assert sim.disable_profiling() is stats and sim.profile is None and not sim.hooks
@@ -0,0 +1,24 @@
+from sweep import expand_grid, sweep
+import numpy as np
+
+
+def test_expand_grid():
+    tasks = expand_grid({"model": "SIR", "beta": [0.001, 0.002], "seed": range(3)})
+    assert len(tasks) == 6
+    assert tasks[0] == {"model": "SIR", "beta": 0.001, "seed": 0}
+
+
+def test_sweep_collects_columns():
+    grid = [
+        {"model": "SIR", "beta": 0.001},
+        {"model": "SEIRD", "beta": 0.002, "population_size": 300},
+        {"model": "SIR", "beta": 0.02, "population_size": 100, "duration": 20, "seed": 1},
+    ]
+    results = sweep(grid, max_workers=2, chunksize=1)
+
+    assert sorted(results["task"].tolist()) == [0, 1, 2]
+    assert np.all(results["elapsed"] > 0)
+    for task, model, series in zip(results["task"], results["model"], results["series"]):
+        assert series.shape[0] == (5 if model == "SEIRD" else 3)
+        if task == 2:  # Stochastic run, one column per tick
+            assert series.shape[1] == 20
@@ -0,0 +1,67 @@
+from visualisations import downsample, Plot
+import visualisations
+import matplotlib.pyplot as plt
+import numpy as np
+
+
+def test_downsample_keeps_peaks_and_ends():
+    time = np.linspace(0, 1000, 100_001)
+    wave = np.sin(time / 30) * np.exp(-time / 500)
+    spike = np.exp(-(((time - 433.3) / 2) ** 2))
+
+    (small_wave, small_spike), small_time = downsample([wave, spike], time, 200)
+
+    assert len(small_time) <= 2 * 2 * 200 + 2
+    assert small_time[0] == time[0] and small_time[-1] == time[-1]
+    assert small_spike.max() == spike.max()
+    assert small_wave.max() == wave.max() and small_wave.min() == wave.min()
+    assert np.all(np.diff(small_time) > 0)
+
+
+def test_downsample_leaves_short_series_alone():
+    time = np.arange(10)
+    values, same_time = downsample([time * 2], time, 100)
+    assert same_time is time
+
+
+def animate(monkeypatch, *args, **kwargs):
+    """Sets up Plot.window on the Agg backend, returning the figure, update and frames."""
+    plt.switch_backend("agg")
+    animation = {}
+
+    def record(fig, update, frames, **options):
+        animation.update(fig=fig, update=update, frames=frames, options=options)
+
+    monkeypatch.setattr(visualisations, "FuncAnimation", record)
+    monkeypatch.setattr(plt, "show", lambda: None)
+    Plot.window(*args, **kwargs)
+    plt.close(animation["fig"])
+    return animation
+
+
+def test_window_extends_lines_created_once(monkeypatch):
+    time = np.arange(0, 100.1, 0.1)
+    values = [1000 - time, time, time / 2]
+    animation = animate(monkeypatch, values, "SIR", time, step=50)
+    assert animation["options"]["blit"]
+
+    lines = list(animation["fig"].axes[0].lines)
+    assert len(lines) == 3 and all(len(line.get_xdata()) == 0 for line in lines)
+
+    lengths = []
+    for frame in animation["frames"]:
+        assert animation["update"](frame) == lines
+        lengths.append(len(lines[1].get_xdata()))
+    # Every frame adds step points, and the last one completes the curve
+    assert animation["frames"] == [*range(49, 1000, 50), 1000]
+    assert lengths == [*range(50, 1001, 50), 1001]
+    np.testing.assert_array_equal(lines[1].get_ydata(), time)
+    assert animation["fig"].axes[0].lines[:] == lines
+
+
+def test_window_animates_in_about_the_given_frames(monkeypatch):
+    time = np.arange(0, 100.1, 0.1)
+    values = [1000 - time, time, time / 2]
+    for frames in (10, 100, 5000):
+        animation = animate(monkeypatch, values, "SIR", time, frames=frames)
+        assert min(frames, len(time)) <= len(animation["frames"]) <= frames + 1
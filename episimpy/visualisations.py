@@ -1,43 +1,98 @@
 import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation
 import plotext as plx
+import numpy as np
 import time
 
 
+# Label and color of each series, in the order the models return them
+SERIES = {
+    "SIR": [("Susceptible", "blue"), ("Infected", "red"), ("Recovered", "darkgreen")],
+    "SEIRD": [
+        ("Susceptible", "blue"),
+        ("Exposed", "orange"),
+        ("Infected", "red"),
+        ("Recovered", "darkgreen"),
+        ("Dead", "black"),
+    ],
+}
+
+
+def downsample(values, time, buckets):
+    """
+    Reduces the series to the points needed to draw them at a resolution of buckets
+    columns: the time range is split into buckets and, for every series, the minimum and
+    maximum of each bucket are kept (min/max decimation), along with the first and last
+    points. All series keep the same points, so every series' peak survives exactly.
+    Returns the reduced values and time.
+    """
+    n = len(time)
+    if n <= 2 * buckets:
+        return values, time
+
+    size = -(-n // buckets)  # Points per bucket, rounded up
+    keep = [np.array([0, n - 1])]
+    for series in values:
+        # Pad the last bucket with its last value, then find each bucket's extremes
+        rows = np.pad(np.asarray(series), (0, buckets * size - n), mode="edge")
+        rows = rows.reshape(buckets, size)
+        offsets = np.arange(buckets) * size
+        keep += [rows.argmin(axis=1) + offsets, rows.argmax(axis=1) + offsets]
+
+    keep = np.unique(np.minimum(np.concatenate(keep), n - 1))
+    return [np.asarray(series)[keep] for series in values], np.asarray(time)[keep]
+
+
 class Plot:
     @staticmethod
-    def window(values, model, time, delay=0.1, step=1):
+    def window(values, model, time, delay=0.03, step=None, frames=100):
         """
         Plot the epidemic curve namely the values of individuals over time on a seperate window
+        The lines are created once and extended every frame, and only they are redrawn
+        (blitting). Every frame adds step points; by default step is chosen so that the
+        whole curve animates in about the given number of frames.
         """
-
-        plt.figure(figsize=(10, 6))
-        plt.ion()  # Interactive mode
-
-        for t in range(0, len(time), step):
-            plt.clf()  # Clear previous figure
-
-            dt = time[: t + 1]
-
-            if model == "SIR":
-                susceptible, infected, recovered = values
-            elif model == "SEIRD":
-                susceptible, exposed, infected, recovered, dead = values
-                plt.plot(dt, exposed[: t + 1], label="Exposed", color="orange")
-                plt.plot(dt, dead[: t + 1], label="Dead", color="black")
-
-            plt.plot(dt, susceptible[: t + 1], label="Susceptible", color="blue")
-            plt.plot(dt, infected[: t + 1], label="Infected", color="red")
-            plt.plot(dt, recovered[: t + 1], label="Recovered", color="darkgreen")
-
-            plt.legend()
-            plt.xlabel("Time (Days)")
-            plt.ylabel("Population")
-            plt.title("Epidemic Curve")
-            plt.pause(delay)  # Pause with delay to simulate
-
-        plt.ioff()
+        fig, ax = plt.subplots(figsize=(10, 6))
+
+        # No more points than the figure has pixels across
+        width = int(fig.get_size_inches()[0] * fig.dpi)
+        values, time = downsample(values, time, width)
+
+        if step is None:
+            step = max(1, len(time) // frames)
+
+        lines = [
+            ax.plot([], [], label=label, color=color)[0] for label, color in SERIES[model]
+        ]
+
+        # The axes are fixed up front, so frames never have to rescale them
+        ax.set_xlim(time[0], time[-1])
+        ax.set_ylim(0, max(max(series) for series in values) * 1.05)
+        ax.legend()
+        ax.set_xlabel("Time (Days)")
+        ax.set_ylabel("Population")
+        ax.set_title("Epidemic Curve")
+
+        def update(t):
+            for line, series in zip(lines, values):
+                line.set_data(time[: t + 1], series[: t + 1])
+            return lines
+
+        # Always finish on the complete curve
+        frame_indices = list(range(step - 1, len(time) - 1, step)) + [len(time) - 1]
+
+        animation = FuncAnimation(
+            fig,
+            update,
+            frames=frame_indices,
+            interval=delay * 1000,
+            blit=True,
+            repeat=False,
+        )
         plt.show()
+        return animation
 
+    @staticmethod
     def terminal(values, model, time):
         """
         Plots the epidemic curve directly in the terminal with enhanced formatting.
@@ -49,6 +104,9 @@ class Plot:
         term_width, term_height = plx.terminal_size()
         plx.plotsize(term_width - 30, term_height - 15)
 
+        # No more points than the plot has columns
+        values, time = downsample(values, time, max(term_width - 30, 1))
+
         # Set the title, labels, and styles
         plx.title("Epidemic Curve")
         plx.xlabel("Days")